@@ -35,6 +35,9 @@
         'views/statistics_report_wizard_views.xml',
         'views/profit_report_wizard_views.xml',
         'reports/profit_report_views.xml',
+        'views/final_telegram_outbox_views.xml',
+        'views/final_booking_analysis_views.xml',
+        'views/final_profit_daily_views.xml',
         'views/final_menu.xml',
     ],
     'demo': [],
@@ -1,3 +1,4 @@
 from . import tg_bot_api
 
 
+from . import profit_report_export
@@ -0,0 +1,32 @@
+from werkzeug.wsgi import wrap_file
+
+from odoo import http
+from odoo.http import content_disposition, request
+
+
+class ProfitReportExportController(http.Controller):
+    @http.route(
+        "/final/profit_report/<int:wizard_id>/export/<string:file_format>",
+        type="http",
+        auth="user",
+        methods=["GET"],
+    )
+    def profit_report_export(self, wizard_id, file_format, **kwargs):
+        wizard = request.env["final.profit.report.wizard"].browse(wizard_id).exists()
+        if not wizard:
+            return request.not_found()
+
+        fileobj, filename, mimetype = wizard._export_to_tempfile(file_format)
+        size = fileobj.seek(0, 2)
+        fileobj.seek(0)
+        # Файл отдается по частям и закрывается (удаляется) после отправки ответа
+        response = request.make_response(
+            wrap_file(request.httprequest.environ, fileobj),
+            headers=[
+                ("Content-Type", mimetype),
+                ("Content-Length", str(size)),
+                ("Content-Disposition", content_disposition(filename)),
+            ],
+        )
+        response.direct_passthrough = True
+        return response
@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from odoo import http, fields
 from odoo.http import request
 
@@ -115,3 +117,58 @@ class TelegramBotApiController(http.Controller):
         }
 
 
+
+    @http.route(
+        "/api/tg/free_slots",
+        type="json",
+        auth="public",
+        methods=["POST"],
+        csrf=False,
+    )
+    def api_tg_free_slots(self, **kwargs):
+        data = request.get_json_data() or {}
+
+        if not self._authenticate_request(data):
+            return {"success": False, "error": "INVALID_TOKEN"}
+
+        telegram_user_id = data.get("telegram_user_id") or data.get("telegram_id")
+        if not telegram_user_id:
+            return {"success": False, "error": "NO_TELEGRAM_ID"}
+
+        partner = self._find_partner_by_telegram_id(telegram_user_id)
+        if not partner:
+            return {"success": False, "error": "NOT_FOUND"}
+
+        try:
+            date_from = fields.Date.to_date(data.get("date")) or fields.Date.context_today(partner)
+            days = max(1, min(int(data.get("days") or 3), 14))
+            duration = float(data.get("duration") or 1.0)
+        except (TypeError, ValueError):
+            return {"success": False, "error": "INVALID_PARAMS"}
+        date_to = date_from + timedelta(days=days - 1)
+
+        booking_env = request.env["final.training.booking"].sudo()
+        slots = []
+        for center in partner.sport_center_ids:
+            # Для клиента важно время, а не конкретный корт/тренер - оставляем уникальные слоты
+            seen = set()
+            for slot in booking_env.find_free_slots(center, date_from, date_to, duration):
+                key = slot["start_datetime"]
+                if key in seen:
+                    continue
+                seen.add(key)
+                slots.append(
+                    {
+                        "sport_center": center.name,
+                        "date": slot["start_datetime"].strftime("%Y-%m-%d"),
+                        "time_start": slot["start_datetime"].strftime("%H:%M"),
+                        "time_end": slot["end_datetime"].strftime("%H:%M"),
+                    }
+                )
+
+        return {
+            "success": True,
+            "partner_id": partner.id,
+            "name": partner.name,
+            "slots": slots,
+        }
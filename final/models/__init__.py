@@ -7,6 +7,11 @@ from . import final_trainer_schedule
 from . import final_center_training_price
 from . import final_training_booking
 from . import final_balance_transaction
+from . import final_balance_snapshot
 from . import res_partner
 from . import final_training_recurring
-
+from . import final_telegram_outbox
+from . import final_training_booking_reminder
+from . import final_booking_daily_stats
+from . import final_booking_analysis
+from . import final_profit_daily
@@ -0,0 +1,164 @@
+import logging
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+
+class FinalBalanceSnapshot(models.Model):
+    _name = "final.balance.snapshot"
+    _description = "Контрольная точка баланса клиента"
+    _order = "partner_id, date desc"
+    _log_access = False
+
+    partner_id = fields.Many2one(
+        "res.partner",
+        string="Клиент",
+        required=True,
+        ondelete="cascade",
+        index=True,
+    )
+    date = fields.Datetime(
+        string="На момент",
+        required=True,
+        help="Баланс учитывает все транзакции строго до этого момента",
+    )
+    currency_id = fields.Many2one(
+        "res.currency",
+        string="Валюта",
+        related="partner_id.balance_currency_id",
+        readonly=True,
+        store=True,
+    )
+    balance = fields.Monetary(
+        string="Баланс",
+        required=True,
+        currency_field="currency_id",
+    )
+
+    _sql_constraints = [
+        (
+            "final_balance_snapshot_partner_date_unique",
+            "unique(partner_id, date)",
+            "Контрольная точка баланса клиента на этот момент уже существует.",
+        )
+    ]
+
+    @api.model
+    def _create_snapshots(self, cutoff, partner_ids=None):
+        """Создает контрольные точки на момент cutoff одним запросом.
+
+        Точка создается только для клиентов, у которых были транзакции после
+        их предыдущей точки: баланс = предыдущая точка + сумма новых транзакций.
+        Для остальных клиентов актуальной остается предыдущая точка.
+
+        :param partner_ids: ограничить клиентами из списка (None - все клиенты)
+        """
+        self.env["final.balance.transaction"].flush_model()
+        self.flush_model()
+        self.env.cr.execute(
+            """
+            WITH prev AS (
+                SELECT DISTINCT ON (partner_id) partner_id, date, balance
+                  FROM final_balance_snapshot
+                 WHERE date < %(cutoff)s
+                   AND (%(partner_ids)s::int[] IS NULL OR partner_id = ANY(%(partner_ids)s::int[]))
+                 ORDER BY partner_id, date DESC
+            ), delta AS (
+                SELECT tx.partner_id,
+                       SUM(CASE WHEN tx.transaction_type = 'deposit' THEN tx.amount ELSE -tx.amount END) AS amount
+                  FROM final_balance_transaction tx
+                  LEFT JOIN prev ON prev.partner_id = tx.partner_id
+                 WHERE tx.date < %(cutoff)s
+                   AND (prev.date IS NULL OR tx.date >= prev.date)
+                   AND (%(partner_ids)s::int[] IS NULL OR tx.partner_id = ANY(%(partner_ids)s::int[]))
+                 GROUP BY tx.partner_id
+            )
+            INSERT INTO final_balance_snapshot (partner_id, date, currency_id, balance)
+            SELECT delta.partner_id, %(cutoff)s, partner.balance_currency_id,
+                   COALESCE(prev.balance, 0) + delta.amount
+              FROM delta
+              JOIN res_partner partner ON partner.id = delta.partner_id
+              LEFT JOIN prev ON prev.partner_id = delta.partner_id
+                ON CONFLICT (partner_id, date) DO NOTHING
+            """,
+            {"cutoff": cutoff, "partner_ids": partner_ids},
+        )
+        return self.env.cr.rowcount
+
+    @api.model
+    def _get_next_cutoffs(self):
+        """Первая недостающая контрольная точка каждого клиента.
+
+        Это начало месяца, следующего за месяцем первой транзакции после
+        последней точки клиента (или первой транзакции вообще). Клиенты без
+        новых транзакций в результат не попадают.
+
+        :return: словарь {cutoff: [id клиентов]}
+        """
+        self.env["final.balance.transaction"].flush_model()
+        self.flush_model()
+        self.env.cr.execute(
+            """
+            WITH last AS (
+                SELECT partner_id, MAX(date) AS date
+                  FROM final_balance_snapshot
+                 GROUP BY partner_id
+            )
+            SELECT date_trunc('month', MIN(tx.date)) + interval '1 month' AS cutoff,
+                   tx.partner_id
+              FROM final_balance_transaction tx
+              LEFT JOIN last ON last.partner_id = tx.partner_id
+             WHERE last.date IS NULL OR tx.date >= last.date
+             GROUP BY tx.partner_id
+            """
+        )
+        cutoffs = {}
+        for cutoff, partner_id in self.env.cr.fetchall():
+            cutoffs.setdefault(cutoff, []).append(partner_id)
+        return cutoffs
+
+    @api.model
+    def cron_create_monthly_snapshots(self):
+        """Cron-задача: контрольные точки балансов на начало каждого месяца.
+
+        Для каждого клиента досоздает точки начиная с его первой недостающей
+        (в том числе удаленных _invalidate_from после транзакций задним числом),
+        по порядку месяцев, чтобы каждая строилась на предыдущей.
+        """
+        next_cutoffs = self._get_next_cutoffs()
+        if not next_cutoffs:
+            return
+
+        month_start = self._get_current_cutoff()
+        cutoff = min(next_cutoffs)
+        partner_ids = []
+        while cutoff <= month_start:
+            # Клиент участвует во всех месяцах начиная со своей первой недостающей точки
+            partner_ids.extend(next_cutoffs.pop(cutoff, []))
+            count = self._create_snapshots(cutoff, partner_ids)
+            _logger.info("Контрольные точки балансов на %s: создано %d", cutoff, count)
+            cutoff += relativedelta(months=1)
+
+    @api.model
+    def _get_current_cutoff(self):
+        """Самая поздняя возможная контрольная точка - начало текущего месяца"""
+        return fields.Datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    @api.model
+    def _invalidate_from(self, partner_ids, date):
+        """Удаляет точки, которые задним числом изменённые транзакции сделали неверными"""
+        if not partner_ids or not date:
+            return
+        # Точек позже начала текущего месяца не бывает: обычные транзакции
+        # "сейчас" ничего не инвалидируют, и запрос не нужен
+        if date >= self._get_current_cutoff():
+            return
+        self.flush_model()
+        self.env.cr.execute(
+            "DELETE FROM final_balance_snapshot WHERE partner_id = ANY(%s) AND date > %s",
+            [list(partner_ids), date],
+        )
+        self.invalidate_model()
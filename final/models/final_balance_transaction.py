@@ -1,4 +1,4 @@
-from odoo import _, api, fields, models
+from odoo import _, api, fields, models, tools
 from odoo.exceptions import ValidationError
 
 
@@ -60,6 +60,42 @@ class FinalBalanceTransaction(models.Model):
         store=True,
     )
 
+    def init(self):
+        # Баланс на дату суммирует транзакции клиента за период после контрольной точки
+        tools.create_index(
+            self.env.cr,
+            "final_balance_transaction_partner_date_idx",
+            self._table,
+            ["partner_id", "date"],
+        )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._invalidate_balance_snapshots()
+        return records
+
+    def write(self, vals):
+        if any(field_name in vals for field_name in ("partner_id", "transaction_type", "amount", "date")):
+            # Контрольные точки неверны как для старых, так и для новых значений
+            self._invalidate_balance_snapshots()
+            res = super().write(vals)
+            self._invalidate_balance_snapshots()
+            return res
+        return super().write(vals)
+
+    def unlink(self):
+        self._invalidate_balance_snapshots()
+        return super().unlink()
+
+    def _invalidate_balance_snapshots(self):
+        """Сбрасывает контрольные точки балансов, созданные после самой ранней из транзакций"""
+        dates = [record.date for record in self if record.date]
+        if dates:
+            self.env["final.balance.snapshot"].sudo()._invalidate_from(
+                set(self.partner_id.ids), min(dates)
+            )
+
     @api.depends("partner_id", "transaction_type", "amount", "date")
     def _compute_display_name(self):
         for record in self:
@@ -80,6 +116,7 @@ class FinalBalanceTransaction(models.Model):
                 )
 
     def action_deposit(self, partner_id, amount, description=""):
+        self._update_partner_balance(partner_id, amount)
         self.create(
             {
                 "partner_id": partner_id,
@@ -90,11 +127,14 @@ class FinalBalanceTransaction(models.Model):
             }
         )
         partner = self.env["res.partner"].sudo().browse(partner_id)
-        partner.balance += amount
+        # Тренировки клиента, отложенные из-за нехватки средств, пробуем завершить сразу
+        self.env["final.training.booking"]._retry_auto_complete_for_partners(partner)
 
     def action_withdrawal(self, partner_id, amount, booking_id=None, description=""):
-        partner = self.env["res.partner"].sudo().browse(partner_id)
-        if partner.balance < amount:
+        # Проверка и списание выполняются одним условным UPDATE:
+        # параллельные списания не уведут баланс в минус и не потеряют изменения
+        if self._update_partner_balance(partner_id, -amount, required=amount) is None:
+            partner = self.env["res.partner"].sudo().browse(partner_id)
             raise ValidationError(
                 _(
                     "Недостаточно средств на балансе клиента '%s'. "
@@ -117,6 +157,94 @@ class FinalBalanceTransaction(models.Model):
             "date": fields.Datetime.now(),
             "description": description,
         })
-        # Обновляем баланс клиента (используем sudo() для обхода прав доступа)
-        partner.balance -= amount
 
+    @api.model
+    def withdraw_many(self, booking, partners, amount, description=""):
+        """Списание одинаковой суммы с нескольких клиентов за тренировку - все или ничего.
+
+        Балансы блокируются и проверяются одним запросом, списываются одним UPDATE,
+        строки журнала создаются одним create().
+
+        :return: созданные транзакции
+        :raise ValidationError: если сумма не положительна или хотя бы у одного
+                                клиента недостаточно средств
+        """
+        if amount <= 0:
+            raise ValidationError(_("Сумма списания должна быть положительным числом."))
+        partners = partners.sudo()
+        if not partners:
+            return self.browse()
+        
+        Partner = self.env["res.partner"]
+        Partner.flush_model(["balance"])
+        # Блокируем строки в порядке id, чтобы параллельные списания не взаимоблокировались
+        self.env.cr.execute(
+            """
+            SELECT id, COALESCE(balance, 0)
+              FROM res_partner
+             WHERE id = ANY(%s)
+             ORDER BY id
+               FOR NO KEY UPDATE
+            """,
+            [partners.ids],
+        )
+        balances = dict(self.env.cr.fetchall())
+        insufficient = partners.filtered(lambda partner: balances.get(partner.id, 0.0) < amount)
+        if insufficient:
+            raise ValidationError(
+                _("Недостаточно средств на балансе у следующих клиентов:\n%s")
+                % "\n".join(
+                    f"{partner.name} (баланс: {balances.get(partner.id, 0.0)} {partner.balance_currency_id.symbol if partner.balance_currency_id else ''}, требуется: {amount} {partner.balance_currency_id.symbol if partner.balance_currency_id else ''})"
+                    for partner in insufficient
+                )
+            )
+        
+        self.env.cr.execute(
+            "UPDATE res_partner SET balance = COALESCE(balance, 0) - %s WHERE id = ANY(%s)",
+            [amount, partners.ids],
+        )
+        partners.invalidate_recordset(["balance"])
+        
+        now = fields.Datetime.now()
+        return self.create([
+            {
+                "partner_id": partner.id,
+                "transaction_type": "withdrawal",
+                "amount": amount,
+                "booking_id": booking.id if booking else False,
+                "date": now,
+                "description": description,
+            }
+            for partner in partners
+        ])
+
+    @api.model
+    def _update_partner_balance(self, partner_id, delta, required=None):
+        """Атомарно изменяет баланс клиента одним UPDATE ... RETURNING.
+
+        :param delta: изменение баланса (отрицательное для списания)
+        :param required: минимальный баланс, при котором изменение допустимо
+        :return: новый баланс или None, если баланса недостаточно
+        """
+        Partner = self.env["res.partner"]
+        Partner.flush_model(["balance"])
+        if required is None:
+            self.env.cr.execute(
+                "UPDATE res_partner SET balance = COALESCE(balance, 0) + %s WHERE id = %s RETURNING balance",
+                [delta, partner_id],
+            )
+        else:
+            self.env.cr.execute(
+                """
+                UPDATE res_partner
+                   SET balance = COALESCE(balance, 0) + %s
+                 WHERE id = %s
+                   AND COALESCE(balance, 0) >= %s
+             RETURNING balance
+                """,
+                [delta, partner_id, required],
+            )
+        row = self.env.cr.fetchone()
+        # Баланс в кэше ORM устарел после прямого UPDATE
+        Partner.browse(partner_id).invalidate_recordset(["balance"])
+        return row[0] if row else None
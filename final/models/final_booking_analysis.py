@@ -0,0 +1,149 @@
+from odoo import fields, models, tools
+
+
+class FinalBookingAnalysis(models.Model):
+    _name = "final.booking.analysis"
+    _description = "Анализ тренировок"
+    _auto = False
+    _order = "start_datetime desc"
+    _rec_name = "booking_id"
+
+    booking_id = fields.Many2one(
+        "final.training.booking",
+        string="Тренировка",
+        readonly=True,
+    )
+    start_datetime = fields.Datetime(
+        string="Начало",
+        readonly=True,
+    )
+    state = fields.Selection(
+        selection=[
+            ("draft", "Черновик"),
+            ("pending_approval", "На одобрении"),
+            ("confirmed", "Подтверждена"),
+            ("completed", "Завершена"),
+            ("cancelled", "Отменена"),
+        ],
+        string="Статус",
+        readonly=True,
+    )
+    sport_center_id = fields.Many2one(
+        "final.sport.center",
+        string="Спортивный центр",
+        readonly=True,
+    )
+    tennis_court_id = fields.Many2one(
+        "final.tennis.court",
+        string="Корт",
+        readonly=True,
+    )
+    trainer_id = fields.Many2one(
+        "hr.employee",
+        string="Тренер",
+        readonly=True,
+    )
+    training_type_id = fields.Many2one(
+        "final.training.type",
+        string="Вид тренировки",
+        readonly=True,
+    )
+    currency_id = fields.Many2one(
+        "res.currency",
+        string="Валюта",
+        readonly=True,
+    )
+    booking_count = fields.Integer(
+        string="Тренировок",
+        readonly=True,
+    )
+    client_count = fields.Integer(
+        string="Клиентов",
+        readonly=True,
+    )
+    duration_hours = fields.Float(
+        string="Часов",
+        readonly=True,
+    )
+    price_per_hour = fields.Monetary(
+        string="Цена за час (за чел.)",
+        currency_field="currency_id",
+        aggregator="avg",
+        readonly=True,
+    )
+    list_price_per_hour = fields.Monetary(
+        string="Цена за час по прайсу",
+        currency_field="currency_id",
+        aggregator="avg",
+        readonly=True,
+        help="Текущая цена вида тренировки в спортивном центре",
+    )
+    trainer_rate_per_hour = fields.Monetary(
+        string="Ставка тренера за час (за чел.)",
+        currency_field="currency_id",
+        aggregator="avg",
+        readonly=True,
+    )
+    list_trainer_rate_per_hour = fields.Monetary(
+        string="Ставка тренера по тарифу",
+        currency_field="currency_id",
+        aggregator="avg",
+        readonly=True,
+        help="Текущая ставка тренера за вид тренировки в спортивном центре",
+    )
+    total_price = fields.Monetary(
+        string="Выручка",
+        currency_field="currency_id",
+        readonly=True,
+    )
+    trainer_rate_amount = fields.Monetary(
+        string="Ставка тренера",
+        currency_field="currency_id",
+        readonly=True,
+    )
+    profit_amount = fields.Monetary(
+        string="Прибыль",
+        currency_field="currency_id",
+        readonly=True,
+    )
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(
+            f"""
+            CREATE OR REPLACE VIEW {self._table} AS (
+                SELECT booking.id,
+                       booking.id AS booking_id,
+                       booking.start_datetime,
+                       booking.state,
+                       booking.sport_center_id,
+                       booking.tennis_court_id,
+                       booking.trainer_id,
+                       booking.training_type_id,
+                       booking.currency_id,
+                       1 AS booking_count,
+                       clients.client_count,
+                       COALESCE(booking.duration_hours, 0) AS duration_hours,
+                       COALESCE(booking.price_per_hour, 0) AS price_per_hour,
+                       price.price_per_hour AS list_price_per_hour,
+                       COALESCE(booking.trainer_rate_per_hour, 0) AS trainer_rate_per_hour,
+                       rate.hour_rate AS list_trainer_rate_per_hour,
+                       COALESCE(booking.total_price, 0) AS total_price,
+                       COALESCE(booking.trainer_rate_amount, 0) AS trainer_rate_amount,
+                       COALESCE(booking.profit_amount, 0) AS profit_amount
+                  FROM final_training_booking booking
+                 CROSS JOIN LATERAL (
+                        SELECT COUNT(*) AS client_count
+                          FROM final_training_booking_partner_rel rel
+                         WHERE rel.booking_id = booking.id
+                       ) clients
+                  LEFT JOIN final_center_training_price price
+                         ON price.center_id = booking.sport_center_id
+                        AND price.training_type_id = booking.training_type_id
+                  LEFT JOIN final_trainer_rate rate
+                         ON rate.trainer_id = booking.trainer_id
+                        AND rate.center_id = booking.sport_center_id
+                        AND rate.training_type_id = booking.training_type_id
+            )
+            """
+        )
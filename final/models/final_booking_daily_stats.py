@@ -0,0 +1,314 @@
+import logging
+
+from odoo import api, fields, models, tools
+
+_logger = logging.getLogger(__name__)
+
+# Статусы тренировок, которые учитываются в дневной статистике
+STATS_BOOKING_STATES = ("confirmed", "completed")
+# Поля тренировки, изменение которых меняет ключ или суммы строки статистики
+STATS_FIELDS = (
+    "state",
+    "start_datetime",
+    "end_datetime",
+    "sport_center_id",
+    "tennis_court_id",
+    "trainer_id",
+    "training_type_id",
+    "client_ids",
+    "price_per_hour",
+    "trainer_rate_per_hour",
+)
+# Сколько ключей пересчитывается одним запросом
+STATS_REFRESH_BATCH_SIZE = 1000
+# Ключ в cr.precommit.data для накопленных изменений текущей транзакции
+STATS_DIRTY_KEY = "final.booking.daily.stats.dirty"
+
+# Агрегация тренировок по ключу статистики; {join} и {where} дополняют запрос
+STATS_AGGREGATE_QUERY = """
+    SELECT booking.start_datetime::date AS date,
+           booking.state,
+           booking.sport_center_id,
+           booking.tennis_court_id,
+           booking.trainer_id,
+           booking.training_type_id,
+           COUNT(*) AS booking_count,
+           SUM((SELECT COUNT(*)
+                  FROM final_training_booking_partner_rel rel
+                 WHERE rel.booking_id = booking.id)) AS client_count,
+           SUM(COALESCE(booking.duration_hours, 0)) AS hours,
+           SUM(COALESCE(booking.total_price, 0)) AS revenue,
+           SUM(COALESCE(booking.trainer_rate_amount, 0)) AS trainer_cost,
+           SUM(COALESCE(booking.profit_amount, 0)) AS profit
+      FROM final_training_booking booking
+      {join}
+     WHERE booking.state IN ('confirmed', 'completed')
+       AND booking.sport_center_id IS NOT NULL
+       {where}
+     GROUP BY 1, 2, 3, 4, 5, 6
+"""
+
+# Ключи, переданные массивами-параметрами
+STATS_KEYS_CTE = """
+    keys AS (
+        SELECT DISTINCT *
+          FROM unnest(%(dates)s::date[], %(states)s::varchar[], %(centers)s::int[],
+                      %(courts)s::int[], %(trainers)s::int[], %(types)s::int[])
+            AS k(date, state, sport_center_id, tennis_court_id, trainer_id, training_type_id)
+    )
+"""
+
+# Совпадение строки с ключом, кроме даты (у тренировки дата вычисляется из начала)
+STATS_KEYS_MATCH = """
+    {alias}.state = k.state
+    AND {alias}.sport_center_id = k.sport_center_id
+    AND {alias}.tennis_court_id IS NOT DISTINCT FROM k.tennis_court_id
+    AND {alias}.trainer_id IS NOT DISTINCT FROM k.trainer_id
+    AND {alias}.training_type_id IS NOT DISTINCT FROM k.training_type_id
+"""
+
+
+class FinalBookingDailyStats(models.Model):
+    _name = "final.booking.daily.stats"
+    _description = "Дневная статистика тренировок"
+    _order = "date desc, sport_center_id"
+    _log_access = False
+
+    date = fields.Date(
+        string="Дата",
+        required=True,
+        index=True,
+    )
+    state = fields.Selection(
+        selection=[
+            ("confirmed", "Подтверждена"),
+            ("completed", "Завершена"),
+        ],
+        string="Статус",
+        required=True,
+    )
+    sport_center_id = fields.Many2one(
+        "final.sport.center",
+        string="Спортивный центр",
+        required=True,
+        ondelete="cascade",
+    )
+    tennis_court_id = fields.Many2one(
+        "final.tennis.court",
+        string="Корт",
+        ondelete="cascade",
+    )
+    trainer_id = fields.Many2one(
+        "hr.employee",
+        string="Тренер",
+        ondelete="cascade",
+    )
+    training_type_id = fields.Many2one(
+        "final.training.type",
+        string="Вид тренировки",
+        ondelete="cascade",
+    )
+    booking_count = fields.Integer(
+        string="Тренировок",
+    )
+    client_count = fields.Integer(
+        string="Клиентов",
+    )
+    hours = fields.Float(
+        string="Часов",
+    )
+    revenue = fields.Float(
+        string="Выручка",
+    )
+    trainer_cost = fields.Float(
+        string="Ставка тренеров",
+    )
+    profit = fields.Float(
+        string="Прибыль",
+    )
+
+    def init(self):
+        # Один ключ - одна строка; пустые корт, тренер и вид сравниваются как равные
+        tools.create_unique_index(
+            self.env.cr,
+            "final_booking_daily_stats_key_uniq",
+            self._table,
+            [
+                "date",
+                "state",
+                "sport_center_id",
+                "COALESCE(tennis_court_id, 0)",
+                "COALESCE(trainer_id, 0)",
+                "COALESCE(training_type_id, 0)",
+            ],
+        )
+        # При установке модуля заполняем таблицу по существующим тренировкам
+        self.env.cr.execute("SELECT 1 FROM final_booking_daily_stats LIMIT 1")
+        if not self.env.cr.fetchone():
+            self._reconcile()
+
+    @api.model
+    def _get_booking_keys(self, bookings):
+        """Ключи статистики, под которые сейчас попадают тренировки (по данным в кэше)"""
+        return {
+            (
+                booking.start_datetime.date(),
+                booking.state,
+                booking.sport_center_id.id,
+                booking.tennis_court_id.id or None,
+                booking.trainer_id.id or None,
+                booking.training_type_id.id or None,
+            )
+            for booking in bookings
+            if booking.state in STATS_BOOKING_STATES and booking.start_datetime and booking.sport_center_id
+        }
+
+    @api.model
+    def _mark_dirty(self, keys=(), booking_ids=()):
+        """Запоминает ключи и тренировки, статистику которых нужно пересчитать.
+
+        Пересчет выполняется один раз перед коммитом транзакции, когда
+        вычисляемые суммы тренировок уже записаны в базу.
+        """
+        if not keys and not booking_ids:
+            return
+        data = self.env.cr.precommit.data
+        dirty = data.get(STATS_DIRTY_KEY)
+        if dirty is None:
+            dirty = data[STATS_DIRTY_KEY] = {"keys": set(), "booking_ids": set()}
+            self.env.cr.precommit.add(self.sudo()._flush_dirty)
+        dirty["keys"].update(keys)
+        dirty["booking_ids"].update(booking_ids)
+
+    def _flush_dirty(self):
+        dirty = self.env.cr.precommit.data.pop(STATS_DIRTY_KEY, None)
+        if not dirty:
+            return
+        keys = set(dirty["keys"])
+        booking_ids = list(dirty["booking_ids"])
+        if booking_ids:
+            # Новые ключи читаем из базы: к этому моменту суммы пересчитаны и записаны
+            self.env.cr.execute(
+                """
+                SELECT DISTINCT start_datetime::date, state, sport_center_id,
+                       tennis_court_id, trainer_id, training_type_id
+                  FROM final_training_booking
+                 WHERE id = ANY(%s)
+                   AND state IN %s
+                   AND sport_center_id IS NOT NULL
+                """,
+                [booking_ids, STATS_BOOKING_STATES],
+            )
+            keys.update(self.env.cr.fetchall())
+        self._refresh_keys(keys)
+
+    @api.model
+    def _refresh_keys(self, keys):
+        """Пересчитывает строки статистики для заданных ключей.
+
+        Строки с тренировками обновляются через INSERT ... ON CONFLICT,
+        строки ключей, в которых не осталось тренировок, удаляются.
+        """
+        keys = list(keys)
+        cr = self.env.cr
+        for start in range(0, len(keys), STATS_REFRESH_BATCH_SIZE):
+            batch = keys[start:start + STATS_REFRESH_BATCH_SIZE]
+            params = {
+                "dates": [key[0] for key in batch],
+                "states": [key[1] for key in batch],
+                "centers": [key[2] for key in batch],
+                "courts": [key[3] for key in batch],
+                "trainers": [key[4] for key in batch],
+                "types": [key[5] for key in batch],
+            }
+            aggregate = STATS_AGGREGATE_QUERY.format(
+                join=f"""
+                    JOIN keys k
+                      ON booking.start_datetime >= k.date
+                     AND booking.start_datetime < k.date + 1
+                     AND {STATS_KEYS_MATCH.format(alias="booking")}
+                """,
+                where="",
+            )
+            cr.execute(
+                f"""
+                WITH {STATS_KEYS_CTE}, actual AS ({aggregate})
+                INSERT INTO final_booking_daily_stats (
+                    date, state, sport_center_id, tennis_court_id, trainer_id, training_type_id,
+                    booking_count, client_count, hours, revenue, trainer_cost, profit
+                )
+                SELECT * FROM actual
+                    ON CONFLICT (date, state, sport_center_id, COALESCE(tennis_court_id, 0),
+                                 COALESCE(trainer_id, 0), COALESCE(training_type_id, 0))
+                    DO UPDATE SET booking_count = EXCLUDED.booking_count,
+                                  client_count = EXCLUDED.client_count,
+                                  hours = EXCLUDED.hours,
+                                  revenue = EXCLUDED.revenue,
+                                  trainer_cost = EXCLUDED.trainer_cost,
+                                  profit = EXCLUDED.profit
+                RETURNING id
+                """,
+                params,
+            )
+            params["kept_ids"] = [row[0] for row in cr.fetchall()]
+            cr.execute(
+                f"""
+                WITH {STATS_KEYS_CTE}
+                DELETE FROM final_booking_daily_stats stats
+                 USING keys k
+                 WHERE stats.date = k.date
+                   AND {STATS_KEYS_MATCH.format(alias="stats")}
+                   AND stats.id != ALL(%(kept_ids)s::int[])
+                """,
+                params,
+            )
+        self.invalidate_model()
+
+    @api.model
+    def _reconcile(self):
+        """Сверяет таблицу с тренировками и исправляет расхождения.
+
+        :return: количество исправленных ключей
+        """
+        self.env["final.training.booking"].flush_model()
+        aggregate = STATS_AGGREGATE_QUERY.format(join="", where="")
+        self.env.cr.execute(
+            f"""
+            WITH actual AS ({aggregate})
+            SELECT COALESCE(actual.date, stats.date),
+                   COALESCE(actual.state, stats.state),
+                   COALESCE(actual.sport_center_id, stats.sport_center_id),
+                   COALESCE(actual.tennis_court_id, stats.tennis_court_id),
+                   COALESCE(actual.trainer_id, stats.trainer_id),
+                   COALESCE(actual.training_type_id, stats.training_type_id)
+              FROM actual
+              FULL JOIN final_booking_daily_stats stats
+                ON stats.date = actual.date
+               AND stats.state = actual.state
+               AND stats.sport_center_id = actual.sport_center_id
+               AND stats.tennis_court_id IS NOT DISTINCT FROM actual.tennis_court_id
+               AND stats.trainer_id IS NOT DISTINCT FROM actual.trainer_id
+               AND stats.training_type_id IS NOT DISTINCT FROM actual.training_type_id
+             WHERE stats.id IS NULL
+                OR actual.date IS NULL
+                OR stats.booking_count != actual.booking_count
+                OR stats.client_count != actual.client_count
+                OR ROUND(stats.hours::numeric, 2) != ROUND(actual.hours::numeric, 2)
+                OR ROUND(stats.revenue::numeric, 2) != ROUND(actual.revenue::numeric, 2)
+                OR ROUND(stats.trainer_cost::numeric, 2) != ROUND(actual.trainer_cost::numeric, 2)
+                OR ROUND(stats.profit::numeric, 2) != ROUND(actual.profit::numeric, 2)
+            """
+        )
+        keys = self.env.cr.fetchall()
+        if keys:
+            self._refresh_keys(keys)
+        return len(keys)
+
+    @api.model
+    def cron_reconcile(self):
+        """Cron-задача: ночная сверка дневной статистики с тренировками"""
+        count = self._reconcile()
+        if count:
+            _logger.warning("Дневная статистика тренировок: исправлено расхождений - %d", count)
+        else:
+            _logger.info("Дневная статистика тренировок: расхождений нет")
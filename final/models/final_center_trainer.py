@@ -115,35 +115,11 @@ class FinalCenterTrainer(models.Model):
 
     @api.depends("employee_id", "sport_center_id")
     def _compute_trainer_rates(self):
-        TrainerRate = self.env["final.trainer.rate"].sudo()
-        TrainingType = self.env["final.training.type"]
-        
+        rates = self.env["final.trainer.rate"].sudo()._get_rates_by_code(
+            self.employee_id.ids, self.sport_center_id.ids
+        )
         for record in self:
-            record.individual_rate = 0.0
-            record.split_rate = 0.0
-            record.group_rate = 0.0
-            
-            if not record.employee_id or not record.sport_center_id:
-                continue
-            
-            # Получаем виды тренировок
-            individual_type = TrainingType.search([("code", "=", "individual")], limit=1)
-            split_type = TrainingType.search([("code", "=", "split")], limit=1)
-            group_type = TrainingType.search([("code", "=", "group")], limit=1)
-            
-            # Получаем ставки тренера для этого центра
-            for code, rate_field, training_type in [
-                ("individual", "individual_rate", individual_type),
-                ("split", "split_rate", split_type),
-                ("group", "group_rate", group_type),
-            ]:
-                if not training_type:
-                    continue
-                rate = TrainerRate.search([
-                    ("trainer_id", "=", record.employee_id.id),
-                    ("center_id", "=", record.sport_center_id.id),
-                    ("training_type_id", "=", training_type.id),
-                ], limit=1)
-                if rate:
-                    setattr(record, rate_field, rate.hour_rate)
-
+            key = (record.employee_id.id, record.sport_center_id.id)
+            record.individual_rate = rates.get(key + ("individual",), 0.0)
+            record.split_rate = rates.get(key + ("split",), 0.0)
+            record.group_rate = rates.get(key + ("group",), 0.0)
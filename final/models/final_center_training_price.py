@@ -1,4 +1,4 @@
-from odoo import _, api, fields, models
+from odoo import _, api, fields, models, tools
 from odoo.exceptions import ValidationError
 
 
@@ -56,3 +56,44 @@ class FinalCenterTrainingPrice(models.Model):
             if record.price_per_hour < 0:
                 raise ValidationError(_("Цена за час не может быть отрицательной."))
 
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache()
+    def _get_price_matrix(self):
+        """Матрица цен {(center_id, training_type_id): цена за час}.
+
+        Загружается одним запросом и хранится в ormcache реестра,
+        сбрасывается при create/write/unlink цен.
+        """
+        # Иначе незаписанные изменения цен попадут в кэш в старом виде
+        self.flush_model(["center_id", "training_type_id", "price_per_hour"])
+        self.env.cr.execute(
+            "SELECT center_id, training_type_id, price_per_hour FROM final_center_training_price"
+        )
+        return tools.frozendict(
+            ((center_id, training_type_id), price or 0.0)
+            for center_id, training_type_id, price in self.env.cr.fetchall()
+        )
+
+    @api.model
+    def get_price_per_hour(self, center, training_type):
+        """Цена за час тренировки данного вида в центре (0, если не задана)"""
+        if not center or not training_type:
+            return 0.0
+        return self._get_price_matrix().get((center.id, training_type.id), 0.0)
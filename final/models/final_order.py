@@ -367,6 +367,14 @@ class FinalSportCenter(models.Model):
     def _compute_trainer_rates(self):
         """Вычисляет ставки тренера из временного хранилища или из БД"""
         import json
+        # Ставки текущего тренера по всем центрам набора загружаются одним запросом
+        trainer_employee = self.env.user.employee_id
+        rates = {}
+        if trainer_employee and trainer_employee.is_final_trainer:
+            rates = self.env["final.trainer.rate"]._get_rates_by_code(
+                trainer_employee.ids,
+                [record.id for record in self if record.is_trainer_attached and record.id],
+            )
         for record in self:
             # Сначала пытаемся получить из временного хранилища
             try:
@@ -380,42 +388,14 @@ class FinalSportCenter(models.Model):
                 record.trainer_group_rate = 0.0
             
             # Если тренер уже привязан, загружаем из БД
-            if record.is_trainer_attached and record.id:
-                trainer_employee = self.env.user.employee_id
-                if trainer_employee and trainer_employee.is_final_trainer:
-                    TrainingType = self.env["final.training.type"]
-                    TrainerRate = self.env["final.trainer.rate"]
-                    
-                    individual_type = TrainingType.search([("code", "=", "individual")], limit=1)
-                    split_type = TrainingType.search([("code", "=", "split")], limit=1)
-                    group_type = TrainingType.search([("code", "=", "group")], limit=1)
-                    
-                    if individual_type:
-                        rate = TrainerRate.search([
-                            ("trainer_id", "=", trainer_employee.id),
-                            ("center_id", "=", record.id),
-                            ("training_type_id", "=", individual_type.id),
-                        ], limit=1)
-                        if rate:
-                            record.trainer_individual_rate = rate.hour_rate
-                    
-                    if split_type:
-                        rate = TrainerRate.search([
-                            ("trainer_id", "=", trainer_employee.id),
-                            ("center_id", "=", record.id),
-                            ("training_type_id", "=", split_type.id),
-                        ], limit=1)
-                        if rate:
-                            record.trainer_split_rate = rate.hour_rate
-                    
-                    if group_type:
-                        rate = TrainerRate.search([
-                            ("trainer_id", "=", trainer_employee.id),
-                            ("center_id", "=", record.id),
-                            ("training_type_id", "=", group_type.id),
-                        ], limit=1)
-                        if rate:
-                            record.trainer_group_rate = rate.hour_rate
+            if record.is_trainer_attached and record.id and rates:
+                key = (trainer_employee.id, record.id)
+                if key + ("individual",) in rates:
+                    record.trainer_individual_rate = rates[key + ("individual",)]
+                if key + ("split",) in rates:
+                    record.trainer_split_rate = rates[key + ("split",)]
+                if key + ("group",) in rates:
+                    record.trainer_group_rate = rates[key + ("group",)]
 
     def _inverse_trainer_rates(self):
         """Сохраняет ставки во временное хранилище"""
@@ -608,14 +588,10 @@ class FinalSportCenter(models.Model):
             if not center.id:
                 continue
             # Получаем все виды тренировок
-            training_types = TrainingType.search([("active", "=", True)])
+            training_types = TrainingType.browse(TrainingType._get_type_ids_by_code().values())
             for training_type in training_types:
-                # Проверяем, не создана ли уже запись
-                existing = TrainingPrice.search([
-                    ("center_id", "=", center.id),
-                    ("training_type_id", "=", training_type.id),
-                ], limit=1)
-                if not existing:
+                # Проверяем по матрице цен, не создана ли уже запись
+                if (center.id, training_type.id) not in TrainingPrice._get_price_matrix():
                     TrainingPrice.create({
                         "center_id": center.id,
                         "training_type_id": training_type.id,
@@ -645,9 +621,9 @@ class FinalSportCenter(models.Model):
             if not center.id:
                 continue
             # Получаем виды тренировок
-            individual_type = TrainingType.search([("code", "=", "individual")], limit=1)
-            split_type = TrainingType.search([("code", "=", "split")], limit=1)
-            group_type = TrainingType.search([("code", "=", "group")], limit=1)
+            individual_type = TrainingType.get_by_code("individual")
+            split_type = TrainingType.get_by_code("split")
+            group_type = TrainingType.get_by_code("group")
             
             # Обновляем или создаем цены
             for code, price_value, training_type in [
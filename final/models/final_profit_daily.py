@@ -0,0 +1,125 @@
+import logging
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+
+class FinalProfitDaily(models.Model):
+    _name = "final.profit.daily"
+    _description = "Прибыль по дням (материализованное представление)"
+    _auto = False
+    _order = "date desc, sport_center_id"
+
+    date = fields.Date(
+        string="Дата",
+        readonly=True,
+    )
+    sport_center_id = fields.Many2one(
+        "final.sport.center",
+        string="Спортивный центр",
+        readonly=True,
+    )
+    training_type_id = fields.Many2one(
+        "final.training.type",
+        string="Вид тренировки",
+        readonly=True,
+    )
+    currency_id = fields.Many2one(
+        "res.currency",
+        string="Валюта",
+        readonly=True,
+    )
+    booking_count = fields.Integer(
+        string="Тренировок",
+        readonly=True,
+    )
+    hours = fields.Float(
+        string="Часов",
+        readonly=True,
+    )
+    revenue = fields.Monetary(
+        string="Выручка",
+        currency_field="currency_id",
+        readonly=True,
+    )
+    trainer_cost = fields.Monetary(
+        string="Ставка тренеров",
+        currency_field="currency_id",
+        readonly=True,
+    )
+    profit = fields.Monetary(
+        string="Прибыль",
+        currency_field="currency_id",
+        readonly=True,
+    )
+
+    def init(self):
+        # Представление пересоздается при обновлении модуля, чтобы подхватить новое определение
+        self.env.cr.execute(f"DROP MATERIALIZED VIEW IF EXISTS {self._table}")
+        self.env.cr.execute(
+            f"""
+            CREATE MATERIALIZED VIEW {self._table} AS
+            SELECT ((day.date - DATE '2000-01-01')::bigint << 40)
+                   | (day.sport_center_id::bigint << 20)
+                   | COALESCE(day.training_type_id, 0)::bigint AS id,
+                   day.*
+              FROM (
+                    SELECT booking.start_datetime::date AS date,
+                           booking.sport_center_id,
+                           booking.training_type_id,
+                           MIN(booking.currency_id) AS currency_id,
+                           COUNT(*) AS booking_count,
+                           SUM(COALESCE(booking.duration_hours, 0)) AS hours,
+                           SUM(COALESCE(booking.total_price, 0)) AS revenue,
+                           SUM(COALESCE(booking.trainer_rate_amount, 0)) AS trainer_cost,
+                           SUM(COALESCE(booking.profit_amount, 0)) AS profit
+                      FROM final_training_booking booking
+                     WHERE booking.state = 'completed'
+                     GROUP BY 1, 2, 3
+                   ) day
+            """
+        )
+        # REFRESH ... CONCURRENTLY требует уникальный индекс по колонкам без условий.
+        # id детерминированно кодирует ключ (дата, центр, вид), поэтому не меняется
+        # между обновлениями и пересчет затрагивает только изменившиеся строки
+        self.env.cr.execute(f"CREATE UNIQUE INDEX {self._table}_id_uniq ON {self._table} (id)")
+
+    @api.model
+    def refresh(self):
+        """Обновляет представление, не блокируя чтение отчетов.
+
+        Если обновление уже выполняется в другой транзакции, повторное
+        не запускается.
+
+        :return: True, если представление обновлено
+        """
+        cr = self.env.cr
+        cr.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s))", [self._table])
+        if not cr.fetchone()[0]:
+            _logger.info("Обновление %s уже выполняется, пропускаем", self._table)
+            return False
+        self.env["final.training.booking"].flush_model()
+        cr.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {self._table}")
+        self.invalidate_model()
+        return True
+
+    @api.model
+    def cron_refresh(self):
+        """Cron-задача: обновление материализованного представления прибыли"""
+        self.refresh()
+
+    @api.model
+    def _schedule_refresh(self):
+        """Запрашивает обновление через cron (например, после массового завершения тренировок)"""
+        cron = self.env.ref("final.ir_cron_final_profit_daily_refresh", raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+
+    def action_refresh(self):
+        """Кнопка "Обновить данные" в отчете"""
+        self.refresh()
+        return {
+            "type": "ir.actions.client",
+            "tag": "reload",
+        }
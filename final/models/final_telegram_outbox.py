@@ -0,0 +1,190 @@
+import logging
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+from .telegram_delivery import GLOBAL_RATE, get_delivery_engine
+
+_logger = logging.getLogger(__name__)
+
+# Максимальное количество попыток отправки одного сообщения
+MAX_ATTEMPTS = 5
+# Базовая задержка перед повторной попыткой (удваивается с каждой попыткой)
+RETRY_BASE_DELAY = 60
+# Размер пакета диспетчера: сообщения одного окна глобального ограничения Telegram
+DISPATCH_BATCH_SIZE = int(GLOBAL_RATE)
+
+
+class FinalTelegramOutbox(models.Model):
+    _name = "final.telegram.outbox"
+    _description = "Исходящие Telegram-уведомления"
+    _order = "id desc"
+
+    partner_id = fields.Many2one(
+        "res.partner",
+        string="Клиент",
+        ondelete="set null",
+        index=True,
+    )
+    chat_id = fields.Char(
+        string="Chat ID",
+        required=True,
+    )
+    text = fields.Text(
+        string="Текст сообщения",
+        required=True,
+    )
+    booking_id = fields.Many2one(
+        "final.training.booking",
+        string="Тренировка",
+        ondelete="set null",
+        index=True,
+    )
+    state = fields.Selection(
+        selection=[
+            ("pending", "Ожидает отправки"),
+            ("sent", "Отправлено"),
+            ("failed", "Ошибка"),
+        ],
+        string="Статус",
+        default="pending",
+        required=True,
+        index=True,
+    )
+    attempt_count = fields.Integer(
+        string="Попыток",
+        default=0,
+        readonly=True,
+    )
+    next_attempt_at = fields.Datetime(
+        string="Следующая попытка",
+        default=fields.Datetime.now,
+        index=True,
+    )
+    sent_at = fields.Datetime(
+        string="Отправлено",
+        readonly=True,
+    )
+    last_error = fields.Text(
+        string="Последняя ошибка",
+        readonly=True,
+    )
+
+    @api.model
+    def enqueue(self, partner, text, booking=None):
+        """Ставит сообщение в очередь в текущей транзакции.
+
+        Сообщение будет отправлено диспетчером только после коммита,
+        при откате транзакции оно исчезает вместе с остальными изменениями.
+        """
+        if not partner or not partner.telegram_user_id:
+            return self.browse()
+        message = self.sudo().create({
+            "partner_id": partner.id,
+            "chat_id": partner.telegram_user_id,
+            "text": text,
+            "booking_id": booking.id if booking else False,
+        })
+        self._trigger_dispatcher()
+        return message
+
+    @api.model
+    def _trigger_dispatcher(self, at=None):
+        """Запрашивает запуск диспетчера (один раз на транзакцию для немедленного запуска)"""
+        cron = self.env.ref("final.ir_cron_final_telegram_outbox", raise_if_not_found=False)
+        if not cron:
+            return
+        if at is None:
+            data = self.env.cr.precommit.data
+            if data.get("final.telegram.outbox.triggered"):
+                return
+            data["final.telegram.outbox.triggered"] = True
+        cron.sudo()._trigger(at=at)
+
+    @api.model
+    def _get_retry_delay(self, attempt_count, retry_after=None):
+        """Задержка перед следующей попыткой: retry_after от Telegram или экспоненциальная"""
+        if retry_after:
+            return timedelta(seconds=retry_after)
+        return timedelta(seconds=RETRY_BASE_DELAY * 2 ** max(attempt_count - 1, 0))
+
+    def _record_result(self, success, error=None, retry_after=None, permanent=False):
+        """Сохраняет результат попытки отправки и планирует повтор при необходимости"""
+        self.ensure_one()
+        attempt_count = self.attempt_count + 1
+        if success:
+            self.write({
+                "state": "sent",
+                "attempt_count": attempt_count,
+                "sent_at": fields.Datetime.now(),
+                "last_error": False,
+            })
+            return
+        vals = {"attempt_count": attempt_count, "last_error": error}
+        if permanent or attempt_count >= MAX_ATTEMPTS:
+            vals["state"] = "failed"
+            _logger.warning(
+                "Telegram уведомление ID=%d не отправлено клиенту %s: %s",
+                self.id, self.chat_id, error,
+            )
+        else:
+            vals["next_attempt_at"] = fields.Datetime.now() + self._get_retry_delay(attempt_count, retry_after)
+        self.write(vals)
+
+    @api.model
+    def cron_dispatch(self):
+        """Cron-задача: отправка накопившихся уведомлений.
+
+        Сообщения выбираются пакетами с блокировкой SKIP LOCKED, поэтому
+        параллельные обработчики не отправят одно сообщение дважды. Пакет
+        отправляется пулом потоков с ограничением частоты, результаты
+        каждого сообщения сохраняются для повторных попыток.
+        """
+        bot_token = self.env["final.training.booking"]._get_telegram_bot_token()
+        if not bot_token:
+            return
+
+        # Пакет блокируется, отправляется параллельно и фиксируется одним коммитом
+        engine = get_delivery_engine()
+        while True:
+            self.env.cr.execute(
+                """
+                SELECT id
+                  FROM final_telegram_outbox
+                 WHERE state = 'pending'
+                   AND next_attempt_at <= (now() AT TIME ZONE 'UTC')
+                 ORDER BY id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+                """,
+                [DISPATCH_BATCH_SIZE],
+            )
+            messages = self.sudo().browse([row[0] for row in self.env.cr.fetchall()])
+            if not messages:
+                break
+            results = engine.send_many(
+                bot_token,
+                [(message.id, message.chat_id, message.text) for message in messages],
+            )
+            for message in messages:
+                message._record_result(*results[message.id])
+            self.env.cr.commit()
+            if len(messages) < DISPATCH_BATCH_SIZE:
+                break
+
+        # Планируем запуск к ближайшей отложенной попытке
+        next_message = self.sudo().search(
+            [("state", "=", "pending")], order="next_attempt_at", limit=1
+        )
+        if next_message:
+            self._trigger_dispatcher(at=max(next_message.next_attempt_at, fields.Datetime.now()))
+
+    def action_retry(self):
+        """Повторная отправка неотправленных сообщений"""
+        self.filtered(lambda m: m.state == "failed").write({
+            "state": "pending",
+            "attempt_count": 0,
+            "next_attempt_at": fields.Datetime.now(),
+        })
+        self._trigger_dispatcher()
+        return True
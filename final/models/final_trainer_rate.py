@@ -84,5 +84,31 @@ class FinalTrainerRate(models.Model):
             res['trainer_id'] = self.env.user.employee_id.id
         return res
 
+    @api.model
+    def _get_rates_by_code(self, trainer_ids, center_ids):
+        """Ставки тренеров для набора тренеров и центров одним запросом.
 
+        :return: словарь {(trainer_id, center_id, код вида тренировки): ставка за час}
+        """
+        trainer_ids = list(set(trainer_ids))
+        center_ids = list(set(center_ids))
+        if not trainer_ids or not center_ids:
+            return {}
+        self.flush_model(["trainer_id", "center_id", "training_type_id", "hour_rate"])
+        self.env["final.training.type"].flush_model(["code", "active"])
+        self.env.cr.execute(
+            """
+            SELECT rate.trainer_id, rate.center_id, type.code, rate.hour_rate
+              FROM final_trainer_rate rate
+              JOIN final_training_type type ON type.id = rate.training_type_id
+             WHERE type.active
+               AND rate.trainer_id = ANY(%s)
+               AND rate.center_id = ANY(%s)
+            """,
+            [trainer_ids, center_ids],
+        )
+        return {
+            (trainer_id, center_id, code): hour_rate or 0.0
+            for trainer_id, center_id, code, hour_rate in self.env.cr.fetchall()
+        }
 
@@ -1,9 +1,62 @@
 # -*- coding: utf-8 -*-
-from odoo import _, api, fields, models
-from odoo.exceptions import ValidationError
-from datetime import datetime, timedelta
-import requests
-import requests
+from odoo import _, api, fields, models, tools
+from odoo.exceptions import AccessError, MissingError, ValidationError
+from collections import defaultdict
+from psycopg2 import IntegrityError
+from datetime import datetime, time, timedelta
+import logging
+
+from .final_booking_daily_stats import STATS_FIELDS
+
+_logger = logging.getLogger(__name__)
+
+# Статусы, в которых тренировка занимает корт и тренера
+ACTIVE_BOOKING_STATES = ("draft", "pending_approval", "confirmed")
+# Сколько тренировок cron автозавершения обрабатывает за один коммит
+AUTO_COMPLETE_CHUNK_SIZE = 50
+# Задержка повторной попытки автозавершения: удваивается с каждой попыткой, но не больше суток
+AUTO_COMPLETE_RETRY_DELAY = timedelta(hours=1)
+AUTO_COMPLETE_RETRY_MAX_DELAY = timedelta(days=1)
+# Поля, изменение которых влияет на занятость кортов и тренеров
+OCCUPANCY_FIELDS = ("tennis_court_id", "trainer_id", "start_datetime", "end_datetime", "state")
+
+
+def _subtract_intervals(intervals, busy):
+    """Вычитает занятые интервалы из свободных.
+
+    Оба списка - пары (начало, окончание), отсортированные по началу.
+    """
+    result = []
+    for start, end in intervals:
+        for busy_start, busy_end in busy:
+            if busy_end <= start:
+                continue
+            if busy_start >= end:
+                break
+            if busy_start > start:
+                result.append((start, busy_start))
+            start = max(start, busy_end)
+            if start >= end:
+                break
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def _intersect_intervals(left, right):
+    """Пересечение двух отсортированных списков непересекающихся интервалов"""
+    result = []
+    i = j = 0
+    while i < len(left) and j < len(right):
+        start = max(left[i][0], right[j][0])
+        end = min(left[i][1], right[j][1])
+        if start < end:
+            result.append((start, end))
+        if left[i][1] < right[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
 
 
 class FinalTrainingBooking(models.Model):
@@ -175,6 +228,20 @@ class FinalTrainingBooking(models.Model):
         string="Повторяющаяся",
         default=False,
     )
+    recurring_date = fields.Date(
+        string="Дата по шаблону",
+        readonly=True,
+        copy=False,
+        help="Дата, на которую тренировка была создана шаблоном. По ней шаблон "
+             "сопоставляет тренировки при синхронизации.",
+    )
+    recurring_overridden = fields.Boolean(
+        string="Перенесена вручную",
+        readonly=True,
+        copy=False,
+        help="Время тренировки изменено вручную - синхронизация с шаблоном "
+             "не переносит и не отменяет ее.",
+    )
     currency_id = fields.Many2one(
         "res.currency",
         string="Валюта",
@@ -200,6 +267,30 @@ class FinalTrainingBooking(models.Model):
         default=False,
         help="Флаг отправки напоминания за N часов до начала",
     )
+    auto_complete_attempts = fields.Integer(
+        string="Попыток автозавершения",
+        default=0,
+        readonly=True,
+        copy=False,
+    )
+    auto_complete_retry_at = fields.Datetime(
+        string="Повтор автозавершения",
+        readonly=True,
+        copy=False,
+        help="Пока не наступило, cron автозавершения пропускает тренировку. "
+             "Сбрасывается при пополнении баланса клиента.",
+    )
+    auto_complete_error = fields.Char(
+        string="Причина незавершения",
+        readonly=True,
+        copy=False,
+    )
+    reminder_ids = fields.One2many(
+        "final.training.booking.reminder",
+        "booking_id",
+        string="Напоминания",
+        readonly=True,
+    )
     color = fields.Integer(
         string="Цвет",
         compute="_compute_color",
@@ -282,8 +373,248 @@ class FinalTrainingBooking(models.Model):
             "CHECK(duration_hours >= 1)",
             "Минимальная продолжительность тренировки - 1 час.",
         ),
+        # Защита от двойного бронирования на уровне БД: Python-проверки ниже
+        # не видят незакоммиченные записи параллельных транзакций
+        (
+            "final_training_booking_court_no_overlap",
+            "EXCLUDE USING gist ("
+            "tennis_court_id WITH =, "
+            "tsrange(start_datetime, end_datetime) WITH &&"
+            ") WHERE (state IN ('draft', 'pending_approval', 'confirmed'))",
+            "Корт уже занят в это время другой тренировкой.",
+        ),
+        (
+            "final_training_booking_trainer_no_overlap",
+            "EXCLUDE USING gist ("
+            "trainer_id WITH =, "
+            "tsrange(start_datetime, end_datetime) WITH &&"
+            ") WHERE (state IN ('draft', 'pending_approval', 'confirmed'))",
+            "Тренер уже занят другой тренировкой в это время.",
+        ),
     ]
 
+    def _auto_init(self):
+        """Включает btree_gist, нужный для EXCLUDE-ограничений по корту и тренеру"""
+        try:
+            with self.env.cr.savepoint():
+                self.env.cr.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        except Exception as e:
+            # Без расширения ограничения не будут созданы, останутся Python-проверки
+            _logger.warning("Не удалось включить расширение btree_gist: %s", e)
+        return super()._auto_init()
+
+    def init(self):
+        # Cron автозавершения выбирает новые тренировки и тренировки с наступившим повтором
+        tools.create_index(
+            self.env.cr,
+            "final_training_booking_auto_complete_new_idx",
+            self._table,
+            ["end_datetime"],
+            where="state = 'confirmed' AND auto_complete_retry_at IS NULL",
+        )
+        tools.create_index(
+            self.env.cr,
+            "final_training_booking_auto_complete_retry_idx",
+            self._table,
+            ["auto_complete_retry_at"],
+            where="state = 'confirmed' AND auto_complete_retry_at IS NOT NULL",
+        )
+        # Тренировкам шаблонов, созданным до появления recurring_date, проставляем дату начала
+        self.env.cr.execute(
+            """
+            UPDATE final_training_booking
+               SET recurring_date = start_datetime::date
+             WHERE recurring_id IS NOT NULL
+               AND recurring_date IS NULL
+               AND start_datetime IS NOT NULL
+            """
+        )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self._check_overlaps_before_save([
+            {
+                "tennis_court_id": vals.get("tennis_court_id"),
+                "trainer_id": vals.get("trainer_id"),
+                "start_datetime": fields.Datetime.to_datetime(vals.get("start_datetime")),
+                "end_datetime": fields.Datetime.to_datetime(vals.get("end_datetime")),
+                "state": vals.get("state", "draft"),
+            }
+            for vals in vals_list
+        ])
+        records = super().create(vals_list)
+        records._sync_reminders()
+        self.env["final.booking.daily.stats"]._mark_dirty(booking_ids=records.ids)
+        return records
+
+    def write(self, vals):
+        if "start_datetime" in vals and "reminder_sent" not in vals:
+            # После переноса напоминание о новом времени нужно отправить заново
+            vals = dict(vals, reminder_sent=False)
+        if any(field_name in vals for field_name in OCCUPANCY_FIELDS):
+            self._check_overlaps_before_save(
+                [
+                    {
+                        "tennis_court_id": vals.get("tennis_court_id", record.tennis_court_id.id),
+                        "trainer_id": vals.get("trainer_id", record.trainer_id.id),
+                        "start_datetime": fields.Datetime.to_datetime(
+                            vals.get("start_datetime", record.start_datetime)
+                        ),
+                        "end_datetime": fields.Datetime.to_datetime(
+                            vals.get("end_datetime", record.end_datetime)
+                        ),
+                        "state": vals.get("state", record.state),
+                    }
+                    for record in self
+                ],
+                exclude_ids=self.ids,
+            )
+        DailyStats = self.env["final.booking.daily.stats"]
+        stats_changed = any(field_name in vals for field_name in STATS_FIELDS)
+        if stats_changed:
+            # Строки статистики, из которых тренировки уходят, пересчитываем по старым ключам
+            DailyStats._mark_dirty(keys=DailyStats._get_booking_keys(self))
+        res = super().write(vals)
+        if stats_changed:
+            DailyStats._mark_dirty(booking_ids=self.ids)
+        if (
+            ("start_datetime" in vals or "end_datetime" in vals)
+            and not self.env.context.get("recurring_sync")
+        ):
+            # Перенос вручную: синхронизация с шаблоном больше не трогает время тренировки
+            moved = self.filtered(lambda b: b.recurring_id and not b.recurring_overridden)
+            if moved:
+                super(FinalTrainingBooking, moved).write({"recurring_overridden": True})
+        if "start_datetime" in vals:
+            self._sync_reminders(reset=True)
+        elif "state" in vals:
+            self._sync_reminders()
+        return res
+
+    def unlink(self):
+        DailyStats = self.env["final.booking.daily.stats"]
+        DailyStats._mark_dirty(keys=DailyStats._get_booking_keys(self))
+        return super().unlink()
+
+    @api.model
+    def create_bookings_bulk(self, vals_list):
+        """Пакетное создание тренировок с предварительной проверкой в памяти.
+
+        Весь пакет проверяется двумя запросами: пересечения по корту и тренеру
+        с существующими активными тренировками и между строками пакета, дубликаты
+        тренировок шаблона (recurring_id + время начала) и рабочие часы центра.
+        Прошедшие проверку строки создаются одним create().
+
+        :param vals_list: список словарей значений, обязательны sport_center_id,
+                          tennis_court_id, trainer_id, start_datetime, end_datetime
+        :return: (созданные тренировки, список пар (индекс строки, причина пропуска))
+        """
+        skipped = []
+        rows = []
+        for index, vals in enumerate(vals_list):
+            start = fields.Datetime.to_datetime(vals.get("start_datetime"))
+            end = fields.Datetime.to_datetime(vals.get("end_datetime"))
+            if not start or not end or start >= end:
+                skipped.append((index, _("некорректное время")))
+                continue
+            rows.append((index, vals, start, end))
+        if not rows:
+            return self.browse(), skipped
+
+        window_start = min(row[2] for row in rows)
+        window_end = max(row[3] for row in rows)
+        court_ids = {vals.get("tennis_court_id") for _index, vals, _start, _end in rows}
+        trainer_ids = {vals.get("trainer_id") for _index, vals, _start, _end in rows}
+        recurring_ids = {vals.get("recurring_id") for _index, vals, _start, _end in rows if vals.get("recurring_id")}
+
+        # Занятость кортов и тренеров по существующим активным тренировкам
+        busy_by_court = defaultdict(list)
+        busy_by_trainer = defaultdict(list)
+        existing = self.sudo().search([
+            ("state", "in", list(ACTIVE_BOOKING_STATES)),
+            ("start_datetime", "<", window_end),
+            ("end_datetime", ">", window_start),
+            "|",
+            ("tennis_court_id", "in", list(court_ids)),
+            ("trainer_id", "in", list(trainer_ids)),
+        ])
+        for booking in existing:
+            interval = (booking.start_datetime, booking.end_datetime)
+            busy_by_court[booking.tennis_court_id.id].append(interval)
+            busy_by_trainer[booking.trainer_id.id].append(interval)
+
+        # Уже созданные тренировки шаблонов (в любом статусе)
+        existing_occurrences = set()
+        if recurring_ids:
+            for booking in self.sudo().search([
+                ("recurring_id", "in", list(recurring_ids)),
+                ("start_datetime", ">=", window_start),
+                ("start_datetime", "<=", window_end),
+            ]):
+                existing_occurrences.add((booking.recurring_id.id, booking.start_datetime))
+
+        def overlaps(intervals, start, end):
+            return any(busy_start < end and busy_end > start for busy_start, busy_end in intervals)
+
+        centers = self.env["final.sport.center"].sudo().browse(
+            {vals.get("sport_center_id") for _index, vals, _start, _end in rows}
+        )
+        center_by_id = {center.id: center for center in centers}
+
+        accepted = []
+        for index, vals, start, end in rows:
+            court_id = vals.get("tennis_court_id")
+            trainer_id = vals.get("trainer_id")
+            recurring_id = vals.get("recurring_id")
+
+            if recurring_id and (recurring_id, start) in existing_occurrences:
+                skipped.append((index, _("уже существует")))
+                continue
+            if overlaps(busy_by_court[court_id], start, end):
+                skipped.append((index, _("корт занят")))
+                continue
+            if overlaps(busy_by_trainer[trainer_id], start, end):
+                skipped.append((index, _("тренер занят")))
+                continue
+
+            center = center_by_id.get(vals.get("sport_center_id"))
+            # Рабочие часы сравниваются в часовом поясе пользователя, как в _check_court_work_time
+            start_local = fields.Datetime.context_timestamp(self, start)
+            end_local = fields.Datetime.context_timestamp(self, end)
+            start_hour_float = start_local.hour + start_local.minute / 60.0
+            end_hour_float = end_local.hour + end_local.minute / 60.0
+            if center and (start_hour_float < center.work_time_start or end_hour_float > center.work_time_end):
+                skipped.append((index, _("вне рабочих часов")))
+                continue
+
+            # Строка занимает корт и тренера для следующих строк пакета
+            if vals.get("state", "draft") in ACTIVE_BOOKING_STATES:
+                busy_by_court[court_id].append((start, end))
+                busy_by_trainer[trainer_id].append((start, end))
+            if recurring_id:
+                existing_occurrences.add((recurring_id, start))
+            accepted.append((index, vals))
+
+        if not accepted:
+            return self.browse(), skipped
+
+        try:
+            with self.env.cr.savepoint():
+                bookings = self.create([vals for _index, vals in accepted])
+        except (ValidationError, IntegrityError):
+            # Пакет не прошёл остальные ограничения - создаём построчно, чтобы узнать причину.
+            # Прочие ошибки не относятся к данным строк и пробрасываются
+            bookings = self.browse()
+            for index, vals in accepted:
+                try:
+                    with self.env.cr.savepoint():
+                        bookings |= self.create(vals)
+                except (ValidationError, IntegrityError) as e:
+                    skipped.append((index, _("ошибка: %s") % e))
+
+        skipped.sort()
+        return bookings, skipped
+
     @api.depends("trainer_id", "sport_center_id", "training_type_id", "start_datetime", "client_ids")
     def _compute_name(self):
         """Генерация описания тренировки"""
@@ -334,7 +665,7 @@ class FinalTrainingBooking(models.Model):
                 try:
                     trainer_sudo = record.sudo().trainer_id
                     record.trainer_name = trainer_sudo.name if trainer_sudo.exists() else ""
-                except Exception:
+                except (AccessError, MissingError):
                     record.trainer_name = ""
             else:
                 record.trainer_name = ""
@@ -351,47 +682,42 @@ class FinalTrainingBooking(models.Model):
 
     @api.depends("training_type_id", "sport_center_id")
     def _compute_price_per_hour(self):
-        """Получение цены за час из final.center.training.price"""
+        """Получение цены за час из матрицы цен final.center.training.price"""
+        TrainingPrice = self.env["final.center.training.price"]
         for record in self:
-            if not record.training_type_id or not record.sport_center_id:
-                record.price_per_hour = 0.0
-                continue
-            
-            price = self.env["final.center.training.price"].search([
-                ("center_id", "=", record.sport_center_id.id),
-                ("training_type_id", "=", record.training_type_id.id),
-            ], limit=1)
-            
-            record.price_per_hour = price.price_per_hour if price else 0.0
+            record.price_per_hour = TrainingPrice.get_price_per_hour(
+                record.sport_center_id, record.training_type_id
+            )
 
     @api.depends("training_type_id", "trainer_id", "sport_center_id")
     def _compute_trainer_rate_per_hour(self):
-        """Получение ставки тренера за час"""
-        for record in self:
-            if not record.training_type_id or not record.trainer_id or not record.sport_center_id:
-                record.trainer_rate_per_hour = 0.0
-                continue
-            
-            # Находим связь тренера с центром
-            center_trainer = self.env["final.center.trainer"].search([
-                ("sport_center_id", "=", record.sport_center_id.id),
-                ("employee_id", "=", record.trainer_id.id),
-            ], limit=1)
-            
-            if not center_trainer:
+        """Получение ставки тренера за час.
+
+        Связи тренеров с центрами и ставки загружаются на весь набор записей разом.
+        """
+        records = self.filtered(
+            lambda r: r.training_type_id and r.trainer_id and r.sport_center_id
+        )
+        (self - records).trainer_rate_per_hour = 0.0
+        if not records:
+            return
+        
+        trainer_ids = records.trainer_id.ids
+        center_ids = records.sport_center_id.ids
+        # Ставка учитывается только при наличии связи тренера с центром
+        center_trainers = self.env["final.center.trainer"].search([
+            ("sport_center_id", "in", center_ids),
+            ("employee_id", "in", trainer_ids),
+        ])
+        linked = {(link.employee_id.id, link.sport_center_id.id) for link in center_trainers}
+        rates = self.env["final.trainer.rate"].sudo()._get_rates_by_code(trainer_ids, center_ids)
+        
+        for record in records:
+            key = (record.trainer_id.id, record.sport_center_id.id)
+            if key not in linked:
                 record.trainer_rate_per_hour = 0.0
                 continue
-            
-            # Получаем ставку в зависимости от типа тренировки
-            training_code = record.training_type_id.code
-            if training_code == "individual":
-                record.trainer_rate_per_hour = center_trainer.individual_rate
-            elif training_code == "split":
-                record.trainer_rate_per_hour = center_trainer.split_rate
-            elif training_code == "group":
-                record.trainer_rate_per_hour = center_trainer.group_rate
-            else:
-                record.trainer_rate_per_hour = 0.0
+            record.trainer_rate_per_hour = rates.get(key + (record.training_type_id.code,), 0.0)
 
     @api.depends("trainer_rate_per_hour", "duration_hours", "client_ids")
     def _compute_trainer_rate_amount(self):
@@ -534,34 +860,170 @@ class FinalTrainingBooking(models.Model):
                 }
             }
 
+    def _get_overlapping_bookings(self, field_name):
+        """Находит пересечения по корту или тренеру для всего набора записей.
+
+        Один SQL self-join вместо search() на каждую запись. Возвращает словарь
+        {id записи: [id пересекающихся тренировок]}, пересечения упорядочены так же,
+        как в _order модели.
+
+        Защиту от параллельных транзакций дают EXCLUDE-ограничения из _sql_constraints.
+        Пересечения с сохранёнными тренировками отсекает _check_overlaps_before_save
+        до записи в базу, здесь проверяется уже записанный результат.
+        """
+        if field_name not in ("tennis_court_id", "trainer_id"):
+            raise ValueError("Unsupported overlap field: %s" % field_name)
+        if not self.ids:
+            return {}
+
+        self.flush_model([field_name, "start_datetime", "end_datetime", "state"])
+        self.env.cr.execute(
+            f"""
+            SELECT b.id, o.id
+              FROM final_training_booking b
+              JOIN final_training_booking o
+                ON o.{field_name} = b.{field_name}
+               AND o.id != b.id
+               AND o.state IN %s
+               AND o.start_datetime < b.end_datetime
+               AND o.end_datetime > b.start_datetime
+             WHERE b.id IN %s
+             ORDER BY b.id, o.create_date DESC, o.id DESC
+            """,
+            (tuple(ACTIVE_BOOKING_STATES), tuple(self.ids)),
+        )
+        overlaps = {}
+        for booking_id, overlapping_id in self.env.cr.fetchall():
+            overlaps.setdefault(booking_id, []).append(overlapping_id)
+        return overlaps
+
+    @api.model
+    def _get_day_occupancy(self, field_name, res_id, day):
+        """Занятость корта или тренера за день.
+
+        Возвращает кортеж (начало, окончание, id тренировки), отсортированный по началу.
+        """
+        day_start = datetime.combine(day, time.min)
+        bookings = self.sudo().search([
+            (field_name, "=", res_id),
+            ("state", "in", list(ACTIVE_BOOKING_STATES)),
+            ("start_datetime", "<", day_start + timedelta(days=1)),
+            ("end_datetime", ">", day_start),
+        ], order="start_datetime")
+        return tuple((booking.start_datetime, booking.end_datetime, booking.id) for booking in bookings)
+
+    @api.model
+    def _find_occupancy_overlap(self, field_name, res_id, start_datetime, end_datetime, exclude_ids=()):
+        """Возвращает id первой активной тренировки корта или тренера, пересекающейся с интервалом, или False"""
+        domain = [
+            (field_name, "=", res_id),
+            ("state", "in", list(ACTIVE_BOOKING_STATES)),
+            ("start_datetime", "<", end_datetime),
+            ("end_datetime", ">", start_datetime),
+        ]
+        if exclude_ids:
+            domain.append(("id", "not in", list(exclude_ids)))
+        return self.sudo().search(domain, limit=1).id
+
+    @api.model
+    def _get_court_overlap_message(self, court, overlapping):
+        return _(
+            "Корт '%s' уже занят в это время другой тренировкой "
+            "(тренер: %s, время: %s - %s)."
+        ) % (
+            court.name,
+            overlapping.trainer_id.name if overlapping.trainer_id else _("Не указан"),
+            overlapping.start_datetime.strftime("%d.%m.%Y %H:%M") if overlapping.start_datetime else "",
+            overlapping.end_datetime.strftime("%d.%m.%Y %H:%M") if overlapping.end_datetime else "",
+        )
+
+    @api.model
+    def _get_trainer_overlap_message(self, trainer, overlapping):
+        return _(
+            "Тренер '%s' уже занят другой тренировкой в это время "
+            "(СЦ: %s, корт: %s, время: %s - %s). "
+            "Тренер не может проводить несколько тренировок одновременно."
+        ) % (
+            trainer.name or _("Не указан"),
+            overlapping.sport_center_id.name or _("Не указан"),
+            overlapping.tennis_court_id.name or _("Не указан"),
+            overlapping.start_datetime.strftime("%d.%m.%Y %H:%M") if overlapping.start_datetime else "",
+            overlapping.end_datetime.strftime("%H:%M") if overlapping.end_datetime else "",
+        )
+
+    @api.model
+    def _check_overlaps_before_save(self, rows, exclude_ids=()):
+        """Проверка пересечений до записи строк в базу.
+
+        INSERT/UPDATE, нарушающие EXCLUDE-ограничения, завершаются ошибкой
+        базы данных раньше Python-проверок, и пользователь получил бы только
+        общее сообщение ограничения. Поэтому пересечения с уже сохранёнными
+        тренировками ищутся заранее, одним запросом на корт и тренера.
+
+        :param rows: список словарей с ключами tennis_court_id, trainer_id,
+                     start_datetime, end_datetime, state
+        :param exclude_ids: id изменяемых тренировок (не считаются пересечением)
+        """
+        rows = [
+            row for row in rows
+            if row.get("state") in ACTIVE_BOOKING_STATES
+            and row.get("start_datetime") and row.get("end_datetime")
+            and row["start_datetime"] < row["end_datetime"]
+        ]
+        if not rows:
+            return
+        Booking = self.sudo()
+        Booking.flush_model(["tennis_court_id", "trainer_id", "start_datetime", "end_datetime", "state"])
+        for field_name in ("tennis_court_id", "trainer_id"):
+            items = [(index, row) for index, row in enumerate(rows) if row.get(field_name)]
+            if not items:
+                continue
+            self.env.cr.execute(
+                f"""
+                SELECT DISTINCT ON (k.idx) k.idx, o.id
+                  FROM unnest(%s::int[], %s::int[], %s::timestamp[], %s::timestamp[])
+                    AS k(idx, res_id, start_datetime, end_datetime)
+                  JOIN final_training_booking o
+                    ON o.{field_name} = k.res_id
+                   AND o.state IN %s
+                   AND o.start_datetime < k.end_datetime
+                   AND o.end_datetime > k.start_datetime
+                   AND o.id != ALL(%s::int[])
+                 ORDER BY k.idx, o.create_date DESC, o.id DESC
+                 LIMIT 1
+                """,
+                [
+                    [index for index, _row in items],
+                    [row[field_name] for _index, row in items],
+                    [row["start_datetime"] for _index, row in items],
+                    [row["end_datetime"] for _index, row in items],
+                    tuple(ACTIVE_BOOKING_STATES),
+                    list(exclude_ids),
+                ],
+            )
+            found = self.env.cr.fetchone()
+            if not found:
+                continue
+            row = rows[found[0]]
+            overlapping = Booking.browse(found[1])
+            if field_name == "tennis_court_id":
+                court = self.env["final.tennis.court"].sudo().browse(row[field_name])
+                raise ValidationError(self._get_court_overlap_message(court, overlapping))
+            trainer = self.env["hr.employee"].sudo().browse(row[field_name])
+            raise ValidationError(self._get_trainer_overlap_message(trainer, overlapping))
+
     @api.constrains("tennis_court_id", "start_datetime", "end_datetime")
     def _check_court_availability(self):
         """Проверка занятости корта"""
+        # Ищем пересечения с другими записями на том же корте (учитываем только активные)
+        overlaps = self._get_overlapping_bookings("tennis_court_id")
         for record in self:
-            if not record.tennis_court_id or not record.start_datetime or not record.end_datetime:
+            if record.id not in overlaps:
                 continue
-            
-            # Ищем пересечения с другими записями на том же корте
-            overlapping = self.search([
-                ("tennis_court_id", "=", record.tennis_court_id.id),
-                ("id", "!=", record.id),
-                ("state", "in", ["confirmed", "pending_approval", "draft"]),  # Учитываем только активные
-                ("start_datetime", "<", record.end_datetime),
-                ("end_datetime", ">", record.start_datetime),
-            ], limit=1)
-            
-            if overlapping:
-                raise ValidationError(
-                    _(
-                        "Корт '%s' уже занят в это время другой тренировкой "
-                        "(тренер: %s, время: %s - %s)."
-                    ) % (
-                        record.tennis_court_id.name,
-                        overlapping.trainer_id.name if overlapping.trainer_id else _("Не указан"),
-                        overlapping.start_datetime.strftime("%d.%m.%Y %H:%M") if overlapping.start_datetime else "",
-                        overlapping.end_datetime.strftime("%d.%m.%Y %H:%M") if overlapping.end_datetime else "",
-                    )
-                )
+
+            # Используем sudo() для чтения чужой записи, чтобы обойти правила доступа
+            overlapping = self.sudo().browse(overlaps[record.id][0])
+            raise ValidationError(self._get_court_overlap_message(record.tennis_court_id, overlapping))
 
     @api.constrains("trainer_id", "start_datetime", "end_datetime")
     def _check_trainer_availability(self):
@@ -571,33 +1033,13 @@ class FinalTrainingBooking(models.Model):
         тренер может работать в нескольких СЦ, но не может
         иметь пересекающиеся по времени тренировки (даже в разных СЦ/на разных кортах).
         """
+        overlaps = self._get_overlapping_bookings("trainer_id")
         for record in self:
-            if not record.trainer_id or not record.start_datetime or not record.end_datetime:
+            if record.id not in overlaps:
                 continue
 
-            overlapping = self.search([
-                ("trainer_id", "=", record.trainer_id.id),
-                ("id", "!=", record.id),
-                ("state", "in", ["draft", "pending_approval", "confirmed"]),
-                ("start_datetime", "<", record.end_datetime),
-                ("end_datetime", ">", record.start_datetime),
-            ], limit=1)
-
-            if overlapping:
-                raise ValidationError(
-                    _(
-                        "Тренер '%s' уже занят другой тренировкой в это время "
-                        "(СЦ: %s, корт: %s, время: %s - %s). "
-                        "Тренер не может проводить несколько тренировок одновременно."
-                    )
-                    % (
-                        record.trainer_id.name or _("Не указан"),
-                        overlapping.sport_center_id.name or _("Не указан"),
-                        overlapping.tennis_court_id.name or _("Не указан"),
-                        overlapping.start_datetime.strftime("%d.%m.%Y %H:%M") if overlapping.start_datetime else "",
-                        overlapping.end_datetime.strftime("%H:%M") if overlapping.end_datetime else "",
-                    )
-                )
+            overlapping = self.sudo().browse(overlaps[record.id][0])
+            raise ValidationError(self._get_trainer_overlap_message(record.trainer_id, overlapping))
 
     @api.constrains("tennis_court_id", "start_datetime", "end_datetime")
     def _check_court_work_time(self):
@@ -1068,52 +1510,44 @@ class FinalTrainingBooking(models.Model):
         return param_env.get_param("final.telegram_bot_token") or ""
 
     def _send_telegram_message(self, partner, text):
-        """Отправка сообщения клиенту в Telegram напрямую через Bot API.
+        """Постановка сообщения клиенту в очередь Telegram-уведомлений.
 
-        Использует:
-        - final.telegram_bot_token — токен бота
-        - partner.telegram_user_id — chat_id
+        Сообщение сохраняется в final.telegram.outbox в текущей транзакции
+        и отправляется диспетчером после коммита, поэтому бизнес-операции
+        не ждут ответа Telegram.
         """
         if not partner or not partner.telegram_user_id:
             return
 
-        bot_token = self._get_telegram_bot_token()
-        if not bot_token:
+        if not self._get_telegram_bot_token():
             # Токен не настроен — тихо выходим, чтобы не ломать поток бизнес-логики
             return
 
-        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-        payload = {
-            "chat_id": partner.telegram_user_id,
-            "text": text,
-            "parse_mode": "HTML",
-        }
-
-        try:
-            # Используем небольшой таймаут, чтобы не блокировать воркер надолго
-            response = requests.post(url, json=payload, timeout=5)
-            response.raise_for_status()
-            # Логируем успешную отправку
-            import logging
-            _logger = logging.getLogger(__name__)
-            _logger.info(
-                "Telegram уведомление отправлено клиенту %s (ID: %s)",
-                partner.name, partner.telegram_user_id
-            )
-        except Exception as e:
-            # Логируем ошибку, но не поднимаем исключение — уведомления не должны ломать основной поток
-            import logging
-            _logger = logging.getLogger(__name__)
-            _logger.warning(
-                "Ошибка отправки Telegram уведомления клиенту %s (ID: %s): %s",
-                partner.name if partner else "Unknown",
-                partner.telegram_user_id if partner else "Unknown",
-                str(e)
-            )
-            return
+        self.env["final.telegram.outbox"].enqueue(partner, text, booking=self[:1])
 
-    def _build_booking_message(self, is_reminder=False):
-        """Собирает текст сообщения о тренировке для клиента."""
+    @api.model
+    def _format_reminder_lead_time(self, offset_hours):
+        """За сколько до начала: "1 час", "3 часа", "1 день", "1.5 ч." """
+        def plural(number, one, few, many):
+            if number % 10 == 1 and number % 100 != 11:
+                return one
+            if 2 <= number % 10 <= 4 and not 12 <= number % 100 <= 14:
+                return few
+            return many
+
+        if offset_hours >= 24 and float(offset_hours / 24).is_integer():
+            days = int(offset_hours // 24)
+            return "%d %s" % (days, plural(days, "день", "дня", "дней"))
+        if float(offset_hours).is_integer():
+            hours = int(offset_hours)
+            return "%d %s" % (hours, plural(hours, "час", "часа", "часов"))
+        return "%s ч." % ("%.2f" % offset_hours).rstrip("0").rstrip(".")
+
+    def _build_booking_message(self, is_reminder=False, offset_hours=1.0):
+        """Собирает текст сообщения о тренировке для клиента.
+
+        :param offset_hours: за сколько часов до начала отправляется напоминание
+        """
         self.ensure_one()
 
         # Используем время напрямую из полей без конвертации часового пояса,
@@ -1137,7 +1571,7 @@ class FinalTrainingBooking(models.Model):
         training_type = self.training_type_id.name or ""
 
         if is_reminder:
-            header = "Напоминание о тренировке через 1 час:"
+            header = "Напоминание о тренировке через %s:" % self._format_reminder_lead_time(offset_hours)
         else:
             header = "Вы записаны на тренировку:"
 
@@ -1193,12 +1627,7 @@ class FinalTrainingBooking(models.Model):
         if not self.start_datetime:
             return
 
-        param_env = self.env["ir.config_parameter"].sudo()
-        try:
-            hours_str = param_env.get_param("final.reminder_hours") or "1"
-            reminder_hours = float(hours_str)
-        except Exception:
-            reminder_hours = 1.0
+        reminder_hours = min(self._get_reminder_offsets())
 
         now = fields.Datetime.now()
         # Если тренировка уже началась или закончилась — напоминание не шлём
@@ -1207,62 +1636,146 @@ class FinalTrainingBooking(models.Model):
 
         delta_hours = (self.start_datetime - now).total_seconds() / 3600.0
         if 0 < delta_hours <= reminder_hours:
-            message_text = self._build_booking_message(is_reminder=True)
+            message_text = self._build_booking_message(is_reminder=True, offset_hours=reminder_hours)
             for partner in self.client_ids:
                 self._send_telegram_message(partner, message_text)
             self.reminder_sent = True
 
     @api.model
-    def cron_send_training_reminders(self):
-        """Cron-задача: отправка напоминаний клиентам за 1 час до тренировки.
+    def _get_reminder_offsets(self):
+        """За сколько часов до начала отправлять напоминания.
 
-        Логика:
-        - Берём тренировки в статусе confirmed
-        - У которых reminder_sent = False
-        - Время начала в интервале [now, now + N часов]
-          (N берётся из настроек final.reminder_hours, по умолчанию 1)
-        - Для каждого клиента отправляем сообщение и отмечаем reminder_sent = True
+        Берется из final.reminder_hours: одно число или список через запятую,
+        например "24,1". По умолчанию - за 1 час.
         """
         param_env = self.env["ir.config_parameter"].sudo()
-        try:
-            hours_str = param_env.get_param("final.reminder_hours") or "1"
-            reminder_hours = float(hours_str)
-        except Exception:
-            reminder_hours = 1.0
+        offsets = set()
+        for value in (param_env.get_param("final.reminder_hours") or "1").split(","):
+            try:
+                offset = float(value.strip())
+            except ValueError:
+                continue
+            if offset > 0:
+                offsets.add(offset)
+        return sorted(offsets, reverse=True) or [1.0]
+
+    def _sync_reminders(self, reset=False):
+        """Пересоздает строки напоминаний для подтвержденных будущих тренировок.
+
+        Неотправленные напоминания удаляются и создаются заново одним пакетом,
+        при reset (перенос тренировки) удаляются и уже отправленные.
+        Если часть напоминаний уже опоздала, остается только одно - ближайшее
+        к началу, чтобы клиент не получил несколько сообщений подряд.
+        """
+        Reminder = self.env["final.training.booking.reminder"].sudo()
+        reminders = self.sudo().reminder_ids
+        if not reset:
+            reminders = reminders.filtered(lambda r: not r.sent_at)
+        sent_offsets = {
+            (reminder.booking_id.id, reminder.offset_hours)
+            for reminder in self.sudo().reminder_ids - reminders
+        }
+        reminders.unlink()
 
         now = fields.Datetime.now()
-        # Вычисляем временной интервал для отправки напоминаний:
-        # от (reminder_hours - 0.2) до (reminder_hours + 0.2) часов до начала
-        # Это позволяет учесть погрешность времени выполнения cron (запускается каждые 10 минут)
-        reminder_min = now + timedelta(hours=reminder_hours - 0.2)
-        reminder_max = now + timedelta(hours=reminder_hours + 0.2)
-
-        # Берём все неподтверждённые напоминания для тренировок,
-        # которые начнутся в интервале [reminder_min, reminder_max] (примерно за N часов).
-        bookings = self.sudo().search([
-            ("state", "=", "confirmed"),
-            ("reminder_sent", "=", False),
-            ("start_datetime", ">=", reminder_min),
-            ("start_datetime", "<=", reminder_max),
-        ])
+        offsets = self._get_reminder_offsets()
+        vals_list = []
+        for record in self:
+            if record.state != "confirmed" or not record.start_datetime or record.start_datetime <= now:
+                continue
+            due = [
+                (offset, record.start_datetime - timedelta(hours=offset))
+                for offset in offsets
+                if (record.id, offset) not in sent_offsets
+            ]
+            upcoming = [(offset, due_at) for offset, due_at in due if due_at > now]
+            overdue = [(offset, due_at) for offset, due_at in due if due_at <= now]
+            if overdue and not upcoming:
+                # Напоминания опоздали - отправляем одно, с наименьшим смещением
+                upcoming = [(overdue[-1][0], now)]
+            vals_list += [
+                {"booking_id": record.id, "offset_hours": offset, "due_at": due_at}
+                for offset, due_at in upcoming
+            ]
+        if vals_list:
+            Reminder.create(vals_list)
+            self._schedule_reminders(min(vals["due_at"] for vals in vals_list))
+
+    @api.model
+    def _schedule_reminders(self, due_at):
+        """Планирует запуск cron напоминаний точно ко времени напоминания.
+
+        Достаточно триггера на самое раннее время: каждый запуск cron
+        сам планирует следующий ко времени ближайшего неотправленного напоминания.
+        """
+        cron = self.env.ref("final.ir_cron_final_training_reminders", raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger(at=max(due_at, fields.Datetime.now()))
+
+    @api.model
+    def cron_send_training_reminders(self):
+        """Cron-задача: отправка напоминаний клиентам за N часов до тренировки.
+
+        Запускается триггерами ко времени ближайшего напоминания
+        (см. _schedule_reminders), периодический запуск лишь страхует от пропусков.
+
+        Логика:
+        - Одним запросом по частичному индексу берем наступившие неотправленные
+          напоминания подтвержденных тренировок, которые еще не начались
+        - Ставим сообщения клиентам в очередь (одно на тренировку, даже если
+          наступило несколько напоминаний)
+        - Одним UPDATE отмечаем напоминания отправленными
+        """
+        now = fields.Datetime.now()
+        self.env["final.training.booking.reminder"].flush_model()
+        self.flush_model(["state", "start_datetime"])
+        self.env.cr.execute(
+            """
+            SELECT reminder.id, reminder.booking_id, reminder.offset_hours
+              FROM final_training_booking_reminder reminder
+              JOIN final_training_booking booking ON booking.id = reminder.booking_id
+             WHERE reminder.sent_at IS NULL
+               AND reminder.due_at <= %s
+               AND booking.state = 'confirmed'
+               AND booking.start_datetime > %s
+               FOR UPDATE OF reminder SKIP LOCKED
+            """,
+            [now, now],
+        )
+        rows = self.env.cr.fetchall()
+        reminders = self.env["final.training.booking.reminder"].sudo().browse([row[0] for row in rows])
+        # Если наступило несколько напоминаний, сообщаем ближайший срок
+        offsets = {}
+        for _reminder_id, booking_id, offset_hours in rows:
+            offsets[booking_id] = min(offsets.get(booking_id, offset_hours), offset_hours)
+        bookings = self.sudo().browse(list(offsets))
 
-        import logging
-        _logger = logging.getLogger(__name__)
         _logger.info(
             "Cron напоминаний: найдено %d тренировок для отправки напоминаний",
             len(bookings)
         )
         
         for booking in bookings:
-            message_text = booking._build_booking_message(is_reminder=True)
-            _logger.info(
-                "Отправка напоминания о тренировке ID=%d клиентам: %s",
-                booking.id,
-                ", ".join(booking.client_ids.mapped("name"))
-            )
+            message_text = booking._build_booking_message(is_reminder=True, offset_hours=offsets[booking.id])
             for partner in booking.client_ids:
                 booking._send_telegram_message(partner, message_text)
-            booking.reminder_sent = True
+        if reminders:
+            reminders.write({"sent_at": now})
+            bookings.write({"reminder_sent": True})
+
+        # Следующий запуск - ко времени ближайшего еще не наступившего напоминания
+        self.env.cr.execute(
+            """
+            SELECT min(due_at)
+              FROM final_training_booking_reminder
+             WHERE sent_at IS NULL
+               AND due_at > %s
+            """,
+            [now],
+        )
+        next_due_at = self.env.cr.fetchone()[0]
+        if next_due_at:
+            self._schedule_reminders(next_due_at)
 
     @api.model
     def cron_auto_complete_trainings(self):
@@ -1271,88 +1784,135 @@ class FinalTrainingBooking(models.Model):
         Логика:
         - Берём тренировки в статусе confirmed
         - У которых end_datetime < now (время окончания уже прошло)
-        - Автоматически завершаем их (списываем баланс)
-        - Если баланса недостаточно, логируем предупреждение и оставляем в статусе confirmed
+        - Обрабатываем порциями по AUTO_COMPLETE_CHUNK_SIZE: порция захватывается
+          SELECT ... FOR UPDATE SKIP LOCKED, поэтому несколько воркеров делят
+          очередь без двойного списания, и фиксируется отдельным коммитом
+        - Каждая тренировка завершается в своей точке сохранения: ошибка
+          откатывает только её списания
+        - Если баланса недостаточно или списание не удалось, тренировка остается
+          в статусе confirmed и откладывается (auto_complete_retry_at) с растущей
+          задержкой; пополнение баланса клиента снимает задержку
         """
-        import logging
-        _logger = logging.getLogger(__name__)
-        
         now = fields.Datetime.now()
-        
-        # Ищем тренировки, которые уже закончились, но ещё не завершены
-        bookings = self.sudo().search([
-            ("state", "=", "confirmed"),
-            ("end_datetime", "<", now),
-        ])
+        last_id = 0
+        completed_count = 0
+        
+        while True:
+            # Идем по id, чтобы не захватывать повторно тренировки, оставшиеся в статусе confirmed
+            self.env.cr.execute(
+                """
+                SELECT id
+                  FROM final_training_booking
+                 WHERE state = 'confirmed'
+                   AND end_datetime < %s
+                   AND (auto_complete_retry_at IS NULL OR auto_complete_retry_at <= %s)
+                   AND id > %s
+                 ORDER BY id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+                """,
+                [now, now, last_id, AUTO_COMPLETE_CHUNK_SIZE],
+            )
+            booking_ids = [row[0] for row in self.env.cr.fetchall()]
+            if not booking_ids:
+                break
+            last_id = booking_ids[-1]
+            
+            for booking in self.sudo().browse(booking_ids):
+                try:
+                    with self.env.cr.savepoint():
+                        if booking._auto_complete():
+                            completed_count += 1
+                except Exception as e:
+                    _logger.error(
+                        "Ошибка при автоматическом завершении тренировки ID=%d: %s",
+                        booking.id,
+                        str(e)
+                    )
+                    booking._postpone_auto_complete(str(e))
+            # Фиксируем порцию и снимаем блокировки
+            self.env.cr.commit()
         
         _logger.info(
-            "Cron автоматического завершения: найдено %d тренировок для завершения",
-            len(bookings)
+            "Cron автоматического завершения: завершено %d тренировок",
+            completed_count
         )
+        if completed_count:
+            # Отчеты по прибыли читают материализованное представление - обновляем его
+            self.env["final.profit.daily"]._schedule_refresh()
+
+    def _auto_complete(self):
+        """Автоматическое завершение одной тренировки со списанием баланса.
+
+        :return: True, если тренировка завершена; False, если баланса недостаточно
+        :raise Exception: при прочих ошибках (списания тренировки нужно откатить)
+        """
+        self.ensure_one()
+        if self.state != "confirmed":
+            return False
         
-        for booking in bookings:
-            try:
-                # Рассчитываем сумму списания для каждого клиента
-                amount_per_client = booking.price_per_hour * booking.duration_hours
-                
-                # Проверяем баланс всех клиентов
-                insufficient_balance_clients = []
-                for client in booking.client_ids:
-                    if client.balance < amount_per_client:
-                        insufficient_balance_clients.append(
-                            f"{client.name} (баланс: {client.balance} {client.balance_currency_id.symbol if client.balance_currency_id else ''}, требуется: {amount_per_client} {client.balance_currency_id.symbol if client.balance_currency_id else ''})"
-                        )
-                
-                if insufficient_balance_clients:
-                    # Если баланса недостаточно, логируем предупреждение и не завершаем
-                    _logger.warning(
-                        "Не удалось автоматически завершить тренировку ID=%d: недостаточно средств на балансе у клиентов: %s",
-                        booking.id,
-                        ", ".join(insufficient_balance_clients)
-                    )
-                    continue
-                
-                # Списываем средства с баланса всех клиентов
-                transaction_model = self.env["final.balance.transaction"]
-                for client in booking.client_ids:
-                    description = _(
-                        "Списание за тренировку '%s' (%s - %s)"
-                    ) % (
-                        booking.name or _("Тренировка"),
-                        booking.start_datetime.strftime("%d.%m.%Y %H:%M") if booking.start_datetime else "",
-                        booking.end_datetime.strftime("%H:%M") if booking.end_datetime else "",
-                    )
-                    
-                    try:
-                        transaction_model.action_withdrawal(
-                            client.id,
-                            amount_per_client,
-                            booking.id,
-                            description,
-                        )
-                    except ValidationError as e:
-                        _logger.error(
-                            "Ошибка при автоматическом списании средств с баланса клиента '%s' для тренировки ID=%d: %s",
-                            client.name,
-                            booking.id,
-                            str(e)
-                        )
-                        # Если ошибка при списании, не завершаем тренировку
-                        break
-                else:
-                    # Если все списания прошли успешно, завершаем тренировку
-                    booking.write({"state": "completed"})
-                    _logger.info(
-                        "Тренировка ID=%d автоматически завершена, средства списаны с балансов клиентов",
-                        booking.id
-                    )
-                    
-            except Exception as e:
-                _logger.error(
-                    "Ошибка при автоматическом завершении тренировки ID=%d: %s",
-                    booking.id,
-                    str(e)
-                )
+        # Рассчитываем сумму списания для каждого клиента
+        amount_per_client = self.price_per_hour * self.duration_hours
+        
+        # Проверяем и списываем баланс всех клиентов разом
+        try:
+            self.env["final.balance.transaction"].withdraw_many(
+                self, self.client_ids, amount_per_client, self._get_withdrawal_description()
+            )
+        except ValidationError as e:
+            # Если баланса недостаточно, логируем предупреждение и не завершаем
+            _logger.warning(
+                "Не удалось автоматически завершить тренировку ID=%d: %s",
+                self.id,
+                e.args[0]
+            )
+            self._postpone_auto_complete(e.args[0])
+            return False
+        
+        # Если все списания прошли успешно, завершаем тренировку
+        self.write({"state": "completed"})
+        _logger.info(
+            "Тренировка ID=%d автоматически завершена, средства списаны с балансов клиентов",
+            self.id
+        )
+        return True
+
+    def _get_withdrawal_description(self):
+        """Описание транзакции списания за тренировку"""
+        self.ensure_one()
+        return _(
+            "Списание за тренировку '%s' (%s - %s)"
+        ) % (
+            self.name or _("Тренировка"),
+            self.start_datetime.strftime("%d.%m.%Y %H:%M") if self.start_datetime else "",
+            self.end_datetime.strftime("%H:%M") if self.end_datetime else "",
+        )
+
+    def _postpone_auto_complete(self, error):
+        """Откладывает следующую попытку автозавершения с экспоненциальной задержкой"""
+        self.ensure_one()
+        attempts = self.auto_complete_attempts + 1
+        delay = min(AUTO_COMPLETE_RETRY_DELAY * 2 ** (attempts - 1), AUTO_COMPLETE_RETRY_MAX_DELAY)
+        self.write({
+            "auto_complete_attempts": attempts,
+            "auto_complete_retry_at": fields.Datetime.now() + delay,
+            "auto_complete_error": error[:255],
+        })
+
+    @api.model
+    def _retry_auto_complete_for_partners(self, partners):
+        """Снимает задержку автозавершения с тренировок клиентов (например, после пополнения)"""
+        bookings = self.sudo().search([
+            ("state", "=", "confirmed"),
+            ("auto_complete_retry_at", "!=", False),
+            ("client_ids", "in", partners.ids),
+        ])
+        if not bookings:
+            return
+        bookings.write({"auto_complete_retry_at": fields.Datetime.now()})
+        cron = self.env.ref("final.ir_cron_final_auto_complete_trainings", raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
     
     def _notify_manager_new_request(self):
         """Отправка уведомления менеджеру о новом запросе"""
@@ -1395,50 +1955,16 @@ class FinalTrainingBooking(models.Model):
         # Сумма = цена за час * продолжительность
         amount_per_client = self.price_per_hour * self.duration_hours
         
-        # Проверяем баланс всех клиентов перед списанием
-        insufficient_balance_clients = []
-        for client in self.client_ids:
-            if client.balance < amount_per_client:
-                insufficient_balance_clients.append(
-                    f"{client.name} (баланс: {client.balance} {client.balance_currency_id.symbol if client.balance_currency_id else ''}, требуется: {amount_per_client} {client.balance_currency_id.symbol if client.balance_currency_id else ''})"
-                )
-        
-        if insufficient_balance_clients:
+        # Проверяем и списываем баланс всех клиентов одной операцией: либо у всех, либо ни у кого
+        try:
+            self.env["final.balance.transaction"].withdraw_many(
+                self, self.client_ids, amount_per_client, self._get_withdrawal_description()
+            )
+        except ValidationError as e:
             raise ValidationError(
-                _(
-                    "Недостаточно средств на балансе у следующих клиентов:\n%s\n"
-                    "Пополните баланс перед завершением тренировки."
-                )
-                % "\n".join(insufficient_balance_clients)
+                _("%s\nПополните баланс перед завершением тренировки.") % e.args[0]
             )
         
-        # Списываем средства с баланса всех клиентов
-        transaction_model = self.env["final.balance.transaction"]
-        for client in self.client_ids:
-            description = _(
-                "Списание за тренировку '%s' (%s - %s)"
-            ) % (
-                self.name or _("Тренировка"),
-                self.start_datetime.strftime("%d.%m.%Y %H:%M") if self.start_datetime else "",
-                self.end_datetime.strftime("%H:%M") if self.end_datetime else "",
-            )
-            
-            try:
-                transaction_model.action_withdrawal(
-                    client.id,
-                    amount_per_client,
-                    self.id,
-                    description,
-                )
-            except ValidationError as e:
-                # Если произошла ошибка при списании, откатываем все транзакции
-                raise ValidationError(
-                    _(
-                        "Ошибка при списании средств с баланса клиента '%s': %s"
-                    )
-                    % (client.name, str(e))
-                )
-        
         # Обновляем статус тренировки
         self.write({"state": "completed"})
         
@@ -1853,6 +2379,125 @@ class FinalTrainingBooking(models.Model):
             "help": _("Список тренировок, ожидающих одобрения менеджера. Кликните на запись, чтобы открыть форму с кнопками 'Одобрить' и 'Отклонить'."),
         }
     
+    @api.model
+    def find_free_slots(self, center, date_from, date_to, duration, training_type=None,
+                        trainer=None, court=None, exclude_bookings=None, step=1.0):
+        """Возвращает все свободные слоты корт × тренер в диапазоне дат.
+
+        Активные тренировки и расписание тренеров загружаются за два запроса,
+        дальше слоты считаются в памяти: рабочие часы центра/корта минус занятость
+        корта, пересечённые со свободным временем тренера. Если у тренера на день
+        нет слотов в расписании этого центра, он считается доступным всё рабочее время.
+
+        Время, как и в мастерах записи, задаётся в часах без перевода часового пояса.
+
+        :param center: final.sport.center
+        :param date_from: первая дата диапазона (date)
+        :param date_to: последняя дата диапазона включительно (date)
+        :param duration: продолжительность тренировки в часах
+        :param training_type: final.training.type, ограничивает корты поддерживаемыми видами
+        :param trainer: hr.employee, если не указан - все тренеры центра
+        :param court: final.tennis.court, если не указан - все корты центра
+        :param exclude_bookings: тренировки, которые не считаются занятостью (например, переносимая)
+        :param step: шаг сетки времени начала в часах
+        :return: список словарей start_datetime, end_datetime, tennis_court_id, trainer_id,
+                 отсортированный по времени начала
+        """
+        if not center or not duration or not date_from or not date_to or date_from > date_to:
+            return []
+
+        center = center.sudo()
+        courts = court.sudo() if court else center.tennis_court_ids
+        if training_type:
+            courts = courts.filtered(
+                lambda c: not c.training_type_ids or training_type in c.training_type_ids
+            )
+        if trainer:
+            trainers = trainer.sudo()
+        else:
+            trainers = self.env["final.center.trainer"].sudo().search([
+                ("sport_center_id", "=", center.id),
+            ]).employee_id
+        if not courts or not trainers:
+            return []
+
+        window_start = datetime.combine(date_from, time.min)
+        window_end = datetime.combine(date_to, time.min) + timedelta(days=1)
+
+        # Занятость кортов и тренеров (тренер может быть занят и в другом СЦ)
+        domain = [
+            ("state", "in", list(ACTIVE_BOOKING_STATES)),
+            ("start_datetime", "<", window_end),
+            ("end_datetime", ">", window_start),
+            "|",
+            ("tennis_court_id", "in", courts.ids),
+            ("trainer_id", "in", trainers.ids),
+        ]
+        if exclude_bookings:
+            domain.append(("id", "not in", exclude_bookings.ids))
+        busy_by_court = defaultdict(list)
+        busy_by_trainer = defaultdict(list)
+        for booking in self.sudo().search(domain, order="start_datetime"):
+            interval = (booking.start_datetime, booking.end_datetime)
+            busy_by_court[booking.tennis_court_id.id].append(interval)
+            busy_by_trainer[booking.trainer_id.id].append(interval)
+
+        # Рабочие слоты тренеров в этом центре по дням
+        schedule_by_trainer_day = defaultdict(list)
+        schedules = self.env["final.trainer.schedule"].sudo().search([
+            ("trainer_id", "in", trainers.ids),
+            ("center_id", "=", center.id),
+            ("start_datetime", "<", window_end),
+            ("end_datetime", ">", window_start),
+        ], order="start_datetime")
+        for schedule in schedules:
+            schedule_by_trainer_day[(schedule.trainer_id.id, schedule.start_datetime.date())].append(
+                (schedule.start_datetime, schedule.end_datetime)
+            )
+
+        now = fields.Datetime.now()
+        duration_delta = timedelta(hours=duration)
+        step_delta = timedelta(hours=step)
+        slots = []
+        day = date_from
+        while day <= date_to:
+            day_start = datetime.combine(day, time.min)
+            center_hours = [(
+                day_start + timedelta(hours=center.work_time_start),
+                day_start + timedelta(hours=center.work_time_end),
+            )]
+            trainer_free = {
+                trainer_rec.id: _subtract_intervals(
+                    schedule_by_trainer_day.get((trainer_rec.id, day)) or center_hours,
+                    busy_by_trainer[trainer_rec.id],
+                )
+                for trainer_rec in trainers
+            }
+            for court_rec in courts:
+                court_hours = _intersect_intervals(center_hours, [(
+                    day_start + timedelta(hours=court_rec.work_time_start),
+                    day_start + timedelta(hours=court_rec.work_time_end),
+                )])
+                court_free = _subtract_intervals(court_hours, busy_by_court[court_rec.id])
+                if not court_free:
+                    continue
+                for trainer_rec in trainers:
+                    for start, end in _intersect_intervals(court_free, trainer_free[trainer_rec.id]):
+                        slot_start = start
+                        while slot_start + duration_delta <= end:
+                            if slot_start >= now:
+                                slots.append({
+                                    "start_datetime": slot_start,
+                                    "end_datetime": slot_start + duration_delta,
+                                    "tennis_court_id": court_rec.id,
+                                    "trainer_id": trainer_rec.id,
+                                })
+                            slot_start += step_delta
+            day += timedelta(days=1)
+
+        slots.sort(key=lambda slot: (slot["start_datetime"], slot["tennis_court_id"], slot["trainer_id"]))
+        return slots
+
     @api.model
     def _get_upcoming_week_domain(self):
         """Возвращает домен для фильтра 'Ближайшие' (неделя вперед)"""
@@ -0,0 +1,46 @@
+from odoo import fields, models, tools
+
+
+class FinalTrainingBookingReminder(models.Model):
+    _name = "final.training.booking.reminder"
+    _description = "Напоминание о тренировке"
+    _order = "due_at"
+    _log_access = False
+
+    booking_id = fields.Many2one(
+        "final.training.booking",
+        string="Тренировка",
+        required=True,
+        ondelete="cascade",
+        index=True,
+    )
+    offset_hours = fields.Float(
+        string="За сколько часов",
+        required=True,
+    )
+    due_at = fields.Datetime(
+        string="Время отправки",
+        required=True,
+    )
+    sent_at = fields.Datetime(
+        string="Отправлено",
+    )
+
+    def init(self):
+        # Cron напоминаний читает только неотправленные строки по времени отправки
+        tools.create_index(
+            self.env.cr,
+            "final_training_booking_reminder_unsent_due_idx",
+            self._table,
+            ["due_at"],
+            where="sent_at IS NULL",
+        )
+        # Подтвержденным будущим тренировкам без напоминаний (созданным до появления таблицы)
+        # создаем строки напоминаний
+        bookings = self.env["final.training.booking"].sudo().search([
+            ("state", "=", "confirmed"),
+            ("start_datetime", ">", fields.Datetime.now()),
+            ("reminder_sent", "=", False),
+            ("reminder_ids", "=", False),
+        ])
+        bookings._sync_reminders()
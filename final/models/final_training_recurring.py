@@ -3,6 +3,38 @@ from odoo import _, api, fields, models
 from odoo.exceptions import ValidationError
 from datetime import datetime, timedelta
 import calendar
+import heapq
+import logging
+
+from .final_training_booking import ACTIVE_BOOKING_STATES
+
+_logger = logging.getLogger(__name__)
+
+# Поля шаблона, изменение которых синхронизируется в уже созданные тренировки
+SYNC_FIELDS = (
+    "tennis_court_id",
+    "trainer_id",
+    "training_type_id",
+    "client_ids",
+    "start_date",
+    "end_date",
+    "days_of_week",
+    "time_start",
+    "duration",
+    "frequency",
+    "interval_weeks",
+)
+# Поля шаблона, определяющие даты и время тренировок: только их изменение
+# приводит к переносу, отмене и досозданию тренировок
+SCHEDULE_FIELDS = (
+    "start_date",
+    "end_date",
+    "days_of_week",
+    "time_start",
+    "duration",
+    "frequency",
+    "interval_weeks",
+)
 
 
 class FinalTrainingRecurring(models.Model):
@@ -62,9 +94,9 @@ class FinalTrainingRecurring(models.Model):
     )
     end_date = fields.Date(
         string="Дата окончания",
-        required=True,
         index=True,
-        help="Дата окончания повторяющихся тренировок",
+        help="Дата окончания повторяющихся тренировок. "
+             "Можно не указывать, если задан горизонт генерации.",
     )
     days_of_week = fields.Char(
         string="Дни недели",
@@ -86,12 +118,32 @@ class FinalTrainingRecurring(models.Model):
         selection=[
             ("weekly", "Еженедельно"),
             ("biweekly", "Раз в 2 недели"),
+            ("custom", "Раз в N недель"),
         ],
         string="Частота",
         default="weekly",
         required=True,
         help="Частота повторения тренировок",
     )
+    interval_weeks = fields.Integer(
+        string="Интервал (недель)",
+        default=3,
+        help="Через сколько недель повторять тренировки (для частоты 'Раз в N недель')",
+    )
+    horizon_weeks = fields.Integer(
+        string="Горизонт генерации (недель)",
+        default=0,
+        help="Сколько недель вперед держать созданные тренировки. "
+             "0 - создавать сразу все тренировки до даты окончания. "
+             "Иначе тренировки досоздаются ежедневно по cron.",
+    )
+    last_generated_date = fields.Date(
+        string="Сгенерировано по",
+        readonly=True,
+        copy=False,
+        index=True,
+        help="Дата, до которой включительно уже созданы тренировки",
+    )
     booking_ids = fields.One2many(
         "final.training.booking",
         "recurring_id",
@@ -153,6 +205,16 @@ class FinalTrainingRecurring(models.Model):
             "CHECK(duration >= 1)",
             "Минимальная продолжительность тренировки - 1 час.",
         ),
+        (
+            "final_training_recurring_horizon_weeks_positive",
+            "CHECK(horizon_weeks >= 0)",
+            "Горизонт генерации не может быть отрицательным.",
+        ),
+        (
+            "final_training_recurring_interval_weeks_min",
+            "CHECK(interval_weeks >= 1)",
+            "Интервал повторения должен быть не меньше 1 недели.",
+        ),
     ]
 
     @api.depends("trainer_id", "sport_center_id", "training_type_id", "start_date", "days_of_week")
@@ -208,6 +270,15 @@ class FinalTrainingRecurring(models.Model):
                         _("Дата начала должна предшествовать дате окончания.")
                     )
 
+    @api.constrains("end_date", "horizon_weeks")
+    def _check_end_date_required(self):
+        """Без горизонта генерации дата окончания обязательна"""
+        for record in self:
+            if not record.end_date and not record.horizon_weeks:
+                raise ValidationError(
+                    _("Укажите дату окончания или горизонт генерации для открытого шаблона.")
+                )
+
     @api.constrains("days_of_week")
     def _check_days_of_week(self):
         """Проверка формата дней недели"""
@@ -274,8 +345,23 @@ class FinalTrainingRecurring(models.Model):
         except:
             return []
 
-    def _get_dates_for_generation(self, start_date=None, end_date=None):
-        """Возвращает список дат для генерации тренировок"""
+    def _get_week_interval(self):
+        """Период повторения в неделях"""
+        self.ensure_one()
+        if self.frequency == "biweekly":
+            return 2
+        if self.frequency == "custom":
+            return max(self.interval_weeks, 1)
+        return 1
+
+    def _iter_dates_for_generation(self, start_date=None, end_date=None):
+        """Генератор дат тренировок в диапазоне, по возрастанию.
+
+        Для каждого выбранного дня недели сразу вычисляется первое вхождение
+        в диапазоне, дальше даты идут с шагом 7 * N дней, поэтому стоимость
+        пропорциональна количеству тренировок, а не дней. Четность недель
+        считается от недели начала шаблона, переход через год не влияет.
+        """
         self.ensure_one()
         
         if not start_date:
@@ -283,37 +369,98 @@ class FinalTrainingRecurring(models.Model):
         if not end_date:
             end_date = self.end_date
         
-        if not start_date or not end_date:
-            return []
+        days_of_week = sorted(set(self._parse_days_of_week()))
+        if not start_date or not end_date or not days_of_week:
+            return
         
-        dates = []
-        days_of_week = self._parse_days_of_week()
+        period = timedelta(weeks=self._get_week_interval())
+        # Понедельник недели, от которой отсчитываются повторения
+        anchor = self.start_date or start_date
+        anchor_monday = anchor - timedelta(days=anchor.weekday())
         
-        if not days_of_week:
-            return []
+        def iter_weekday(weekday):
+            current = anchor_monday + timedelta(days=weekday)
+            if current < start_date:
+                # Перепрыгиваем сразу к первому вхождению не раньше start_date
+                periods = -(-(start_date - current).days // period.days)
+                current += period * periods
+            while current <= end_date:
+                yield current
+                current += period
         
-        current_date = start_date
-        # Вычисляем номер недели от начала года для определения четности
-        start_week_num = start_date.isocalendar()[1]
+        yield from heapq.merge(*(iter_weekday(weekday) for weekday in days_of_week))
+
+    def _get_dates_for_generation(self, start_date=None, end_date=None):
+        """Возвращает список дат для генерации тренировок"""
+        return list(self._iter_dates_for_generation(start_date, end_date))
+
+    def _get_horizon_end_date(self):
+        """Последняя дата, до которой должны быть созданы тренировки в режиме горизонта"""
+        self.ensure_one()
+        horizon_end = fields.Date.context_today(self) + timedelta(weeks=self.horizon_weeks)
+        if self.end_date:
+            horizon_end = min(horizon_end, self.end_date)
+        return horizon_end
+
+    def _get_booking_state(self, user):
+        """Статус создаваемых тренировок.
+
+        Если шаблон одобрен менеджером, тренировки создаются сразу подтвержденными.
+        Если не одобрен, то в зависимости от роли пользователя.
+        """
+        self.ensure_one()
+        if not self.approved and user.has_group("final.group_final_trainer"):
+            return "pending_approval"
+        return "confirmed"
+
+    def _create_bookings_for_dates(self, dates, user):
+        """Создает тренировки шаблона на указанные даты одним пакетом.
+
+        Возвращает (созданные тренировки, список строк с причинами пропуска).
+        """
+        self.ensure_one()
+        is_trainer = user.has_group("final.group_final_trainer")
+        state = self._get_booking_state(user)
         
-        while current_date <= end_date:
-            current_weekday = current_date.weekday()  # 0=Monday, 6=Sunday
-            
-            if current_weekday in days_of_week:
-                # Проверяем частоту
-                if self.frequency == "weekly":
-                    # Еженедельно - добавляем все подходящие дни
-                    dates.append(current_date)
-                elif self.frequency == "biweekly":
-                    # Раз в 2 недели - проверяем четность недели
-                    current_week_num = current_date.isocalendar()[1]
-                    week_diff = current_week_num - start_week_num
-                    if week_diff % 2 == 0:
-                        dates.append(current_date)
-            
-            current_date += timedelta(days=1)
+        # Формируем значения для всех дат и создаём их одним пакетом
+        start_hour = int(self.time_start)
+        start_minute = int((self.time_start - start_hour) * 60)
+        vals_list = []
+        for date in dates:
+            start_datetime = datetime.combine(date, datetime.min.time()).replace(
+                hour=start_hour, minute=start_minute, second=0
+            )
+            vals_list.append({
+                "sport_center_id": self.sport_center_id.id,
+                "tennis_court_id": self.tennis_court_id.id,
+                "trainer_id": self.trainer_id.id,
+                "training_type_id": self.training_type_id.id,
+                "client_ids": [(6, 0, self.client_ids.ids)],
+                "start_datetime": start_datetime,
+                "end_datetime": start_datetime + timedelta(hours=self.duration),
+                "state": state,
+                "created_by": user.id,
+                "recurring_id": self.id,
+                "recurring_date": date,
+                "is_recurring": True,
+            })
         
-        return dates
+        # Если тренер генерирует тренировки, используем sudo() для обхода проверки доступа к hr.employee
+        # Это необходимо, так как тренер не имеет доступа к записям других тренеров
+        booking_model = self.env["final.training.booking"]
+        if is_trainer:
+            booking_model = booking_model.sudo()
+        created_bookings, skipped_rows = booking_model.create_bookings_bulk(vals_list)
+        skipped_bookings = [
+            f"{dates[index].strftime('%d.%m.%Y')} - {reason}" for index, reason in skipped_rows
+        ]
+        
+        # Отправляем уведомление менеджеру, если создано тренером и шаблон не одобрен
+        if state == "pending_approval" and not self.approved:
+            for booking in created_bookings:
+                booking._notify_manager_new_request()
+        
+        return created_bookings, skipped_bookings
 
     def generate_bookings(self, start_date=None, end_date=None):
         """Генерирует записи на тренировки на основе параметров"""
@@ -323,10 +470,11 @@ class FinalTrainingRecurring(models.Model):
             raise ValidationError(_("Нельзя генерировать тренировки для неактивного шаблона."))
         
         # Определяем диапазон дат
+        # В режиме горизонта создаём тренировки только на горизонт вперед, остальное досоздаст cron
         if not start_date:
             start_date = self.start_date
         if not end_date:
-            end_date = self.end_date
+            end_date = self._get_horizon_end_date() if self.horizon_weeks else self.end_date
         
         if not start_date or not end_date:
             raise ValidationError(_("Укажите даты начала и окончания для генерации тренировок."))
@@ -339,96 +487,9 @@ class FinalTrainingRecurring(models.Model):
                 _("Не найдено дат для генерации тренировок в указанном диапазоне.")
             )
         
-        # Определяем статус в зависимости от одобрения шаблона
-        # Если шаблон одобрен менеджером, тренировки создаются сразу подтвержденными
-        # Если не одобрен, то в зависимости от роли создателя
-        user = self.env.user
-        is_trainer = user.has_group("final.group_final_trainer")
-        if self.approved:
-            state = "confirmed"
-        else:
-            if is_trainer:
-                state = "pending_approval"
-            else:
-                state = "confirmed"
-        
-        # Генерируем тренировки
-        created_bookings = []
-        skipped_bookings = []
-        
-        for date in dates:
-            # Формируем datetime для начала
-            start_hour = int(self.time_start)
-            start_minute = int((self.time_start - start_hour) * 60)
-            start_datetime = datetime.combine(date, datetime.min.time()).replace(
-                hour=start_hour, minute=start_minute, second=0
-            )
-            
-            # Формируем datetime для окончания
-            end_datetime = start_datetime + timedelta(hours=self.duration)
-            
-            # Проверяем пересечение с существующими записями
-            overlapping = self.env["final.training.booking"].search([
-                ("tennis_court_id", "=", self.tennis_court_id.id),
-                ("state", "in", ["confirmed", "pending_approval", "draft"]),
-                ("start_datetime", "<", end_datetime),
-                ("end_datetime", ">", start_datetime),
-            ], limit=1)
-            
-            # Проверяем, не создана ли уже тренировка на эту дату из этого шаблона
-            existing = self.env["final.training.booking"].search([
-                ("recurring_id", "=", self.id),
-                ("start_datetime", "=", start_datetime),
-            ], limit=1)
-            
-            if existing:
-                skipped_bookings.append(f"{date.strftime('%d.%m.%Y')} - уже существует")
-                continue
-            
-            if overlapping:
-                skipped_bookings.append(f"{date.strftime('%d.%m.%Y')} - корт занят")
-                continue
-            
-            # Проверяем рабочие часы центра
-            center = self.sport_center_id
-            start_hour_float = start_hour + start_minute / 60.0
-            end_hour_float = start_hour_float + self.duration
-            
-            if start_hour_float < center.work_time_start or end_hour_float > center.work_time_end:
-                skipped_bookings.append(f"{date.strftime('%d.%m.%Y')} - вне рабочих часов")
-                continue
-            
-            # Создаем запись
-            try:
-                booking_vals = {
-                    "sport_center_id": self.sport_center_id.id,
-                    "tennis_court_id": self.tennis_court_id.id,
-                    "trainer_id": self.trainer_id.id,
-                    "training_type_id": self.training_type_id.id,
-                    "client_ids": [(6, 0, self.client_ids.ids)],
-                    "start_datetime": start_datetime,
-                    "end_datetime": end_datetime,
-                    "state": state,
-                    "created_by": user.id,
-                    "recurring_id": self.id,
-                    "is_recurring": True,
-                }
-                
-                # Если тренер генерирует тренировки, используем sudo() для обхода проверки доступа к hr.employee
-                # Это необходимо, так как тренер не имеет доступа к записям других тренеров
-                if is_trainer:
-                    booking = self.env["final.training.booking"].sudo().create(booking_vals)
-                else:
-                    booking = self.env["final.training.booking"].create(booking_vals)
-                created_bookings.append(booking)
-                
-                # Отправляем уведомление менеджеру, если создано тренером и шаблон не одобрен
-                if state == "pending_approval" and not self.approved:
-                    booking._notify_manager_new_request()
-            
-            except Exception as e:
-                skipped_bookings.append(f"{date.strftime('%d.%m.%Y')} - ошибка: {str(e)}")
-                continue
+        created_bookings, skipped_bookings = self._create_bookings_for_dates(dates, self.env.user)
+        if not self.last_generated_date or self.last_generated_date < end_date:
+            self.last_generated_date = end_date
         
         # Формируем сообщение о результате
         message_parts = []
@@ -454,7 +515,186 @@ class FinalTrainingRecurring(models.Model):
         """Действие для генерации тренировок (кнопка в форме)"""
         self.ensure_one()
         return self.generate_bookings()
+
+    @api.model
+    def cron_extend_recurring_horizon(self):
+        """Cron-задача: досоздание тренировок шаблонов в режиме горизонта.
+
+        Для каждого активного шаблона с горизонтом создаются тренировки
+        со следующего дня после last_generated_date до сегодня + горизонт.
+        Продлеваются только шаблоны, первую генерацию которых запустил
+        пользователь. Тренировки создаются от имени автора шаблона, чтобы
+        статус совпадал с ручной генерацией.
+        """
+        today = fields.Date.context_today(self)
+        templates = self.sudo().search([
+            ("active", "=", True),
+            ("horizon_weeks", ">", 0),
+            ("last_generated_date", "!=", False),
+            "|",
+            ("end_date", "=", False),
+            ("end_date", ">=", today),
+        ])
+        
+        for template in templates:
+            horizon_end = template._get_horizon_end_date()
+            # Продолжаем с места, где остановилась предыдущая генерация, но не в прошлом
+            date_from = max(template.start_date, today, template.last_generated_date + timedelta(days=1))
+            if date_from > horizon_end:
+                continue
+            
+            try:
+                with self.env.cr.savepoint():
+                    dates = template._get_dates_for_generation(date_from, horizon_end)
+                    created_bookings, skipped_bookings = template._create_bookings_for_dates(
+                        dates, template.created_by
+                    )
+                    template.last_generated_date = horizon_end
+                _logger.info(
+                    "Горизонт шаблона ID=%d продлен до %s: создано %d, пропущено %d",
+                    template.id, horizon_end, len(created_bookings), len(skipped_bookings),
+                )
+            except Exception as e:
+                _logger.error(
+                    "Ошибка при продлении горизонта шаблона ID=%d: %s", template.id, str(e)
+                )
     
+    def write(self, vals):
+        res = super().write(vals)
+        if any(field_name in vals for field_name in SYNC_FIELDS):
+            reschedule = any(field_name in vals for field_name in SCHEDULE_FIELDS)
+            for record in self:
+                record._sync_bookings(reschedule=reschedule)
+        return res
+
+    def _sync_bookings(self, reschedule=True):
+        """Приводит уже созданные тренировки в соответствие с шаблоном.
+
+        Тренировки сопоставляются с датами шаблона по recurring_date. Корт,
+        тренер, вид и клиенты переписываются во всех будущих активных
+        тренировках шаблона. Если изменилось расписание (reschedule), на уже
+        сгенерированном диапазоне лишние тренировки отменяются, сдвинутые
+        переносятся, недостающие создаются. Перенесенные вручную тренировки
+        не переносятся и не отменяются, их дата не создается заново.
+        Прошедшие, завершенные и отмененные тренировки не затрагиваются.
+
+        :param reschedule: изменились поля расписания (SCHEDULE_FIELDS)
+        :return: словарь с количеством созданных, обновленных и отмененных тренировок
+        """
+        self.ensure_one()
+        result = {"created": 0, "updated": 0, "cancelled": 0}
+        if not self.active:
+            return result
+        
+        is_trainer = self.env.user.has_group("final.group_final_trainer")
+        bookings = self.booking_ids.sudo() if is_trainer else self.booking_ids
+        # Записи синхронизации не считаются ручным переносом
+        bookings = bookings.with_context(recurring_sync=True)
+        now = fields.Datetime.now()
+        existing = bookings.filtered(
+            lambda b: b.state in ACTIVE_BOOKING_STATES and b.start_datetime and b.start_datetime >= now
+        ).sorted("start_datetime")
+        if not existing and not (reschedule and self.last_generated_date):
+            # Шаблон еще не генерировался - синхронизировать нечего
+            return result
+        
+        to_cancel = bookings.browse()
+        to_reschedule = []
+        missing_dates = []
+        if reschedule:
+            # Диапазон, который уже был сгенерирован, с учетом новой даты окончания
+            date_from = max(self.start_date, now.date())
+            date_to = self.last_generated_date or max(existing.mapped("start_datetime")).date()
+            if self.end_date:
+                date_to = min(date_to, self.end_date)
+            
+            start_hour = int(self.time_start)
+            start_minute = int((self.time_start - start_hour) * 60)
+            desired = {}
+            for date in self._iter_dates_for_generation(date_from, date_to):
+                start_datetime = datetime.combine(date, datetime.min.time()).replace(
+                    hour=start_hour, minute=start_minute, second=0
+                )
+                if start_datetime >= now:
+                    desired[date] = start_datetime
+            
+            # Сопоставляем тренировки с датами шаблона (по одной на дату).
+            # Перенесенные вручную остаются как есть, но занимают свою дату
+            matched = {}
+            taken_dates = set()
+            for booking in existing:
+                date = booking.recurring_date or booking.start_datetime.date()
+                if booking.recurring_overridden:
+                    taken_dates.add(date)
+                elif date in desired and date not in matched:
+                    matched[date] = booking
+                    taken_dates.add(date)
+                else:
+                    to_cancel |= booking
+            
+            for date, booking in matched.items():
+                start_datetime = desired[date]
+                end_datetime = start_datetime + timedelta(hours=self.duration)
+                if booking.start_datetime != start_datetime or booking.end_datetime != end_datetime:
+                    to_reschedule.append((booking, start_datetime, end_datetime))
+            missing_dates = sorted(date for date in desired if date not in taken_dates)
+        
+        # Общие поля обновляются одним write на все отличающиеся тренировки
+        common_vals = {
+            "tennis_court_id": self.tennis_court_id.id,
+            "trainer_id": self.trainer_id.id,
+            "training_type_id": self.training_type_id.id,
+        }
+        client_ids = set(self.client_ids.ids)
+        to_update_common = bookings.browse()
+        to_update_clients = bookings.browse()
+        for booking in existing - to_cancel:
+            if any(booking[name].id != value for name, value in common_vals.items()):
+                to_update_common |= booking
+            if set(booking.client_ids.ids) != client_ids:
+                to_update_clients |= booking
+        
+        # Сначала отменяем лишние, чтобы освободить корт и тренера под обновления
+        if to_cancel:
+            to_cancel.write({"state": "cancelled"})
+            for booking in to_cancel.filtered(lambda b: b.start_datetime):
+                booking._notify_clients_booking_cancelled()
+            result["cancelled"] = len(to_cancel)
+        
+        updated = to_update_common | to_update_clients
+        for booking, _start, _end in to_reschedule:
+            updated |= booking
+        old_values = {
+            booking.id: (booking.start_datetime, booking.end_datetime, booking.tennis_court_id)
+            for booking in updated
+        }
+        if to_update_common:
+            to_update_common.write(common_vals)
+        if to_update_clients:
+            to_update_clients.write({"client_ids": [(6, 0, list(client_ids))]})
+        # Время у каждой тренировки свое, поэтому пишем только действительно сдвинутые
+        for booking, start_datetime, end_datetime in to_reschedule:
+            booking.write({"start_datetime": start_datetime, "end_datetime": end_datetime})
+        
+        for booking in updated:
+            old_start, old_end, old_court = old_values[booking.id]
+            if booking.state == "confirmed" and (
+                old_start != booking.start_datetime or old_court != booking.tennis_court_id
+            ):
+                booking._notify_clients_booking_rescheduled(old_start, old_end, old_court)
+        result["updated"] = len(updated)
+        
+        # Недостающие даты создаем пакетно
+        if missing_dates:
+            created_bookings, _skipped = self._create_bookings_for_dates(missing_dates, self.env.user)
+            result["created"] = len(created_bookings)
+        
+        _logger.info(
+            "Синхронизация шаблона ID=%d: создано %d, обновлено %d, отменено %d",
+            self.id, result["created"], result["updated"], result["cancelled"],
+        )
+        return result
+
     def action_approve(self):
         """Одобрение шаблона повторяющейся тренировки менеджером"""
         self.ensure_one()
@@ -466,14 +706,9 @@ class FinalTrainingRecurring(models.Model):
         # Проверка баланса клиентов перед одобрением
         # Рассчитываем сумму списания для каждого клиента
         # Нужно получить цену за час для расчета
-        price_per_hour = 0.0
-        if self.sport_center_id and self.training_type_id:
-            price_record = self.env["final.center.training.price"].search([
-                ("center_id", "=", self.sport_center_id.id),
-                ("training_type_id", "=", self.training_type_id.id),
-            ], limit=1)
-            if price_record:
-                price_per_hour = price_record.price_per_hour
+        price_per_hour = self.env["final.center.training.price"].get_price_per_hour(
+            self.sport_center_id, self.training_type_id
+        )
         
         amount_per_client = price_per_hour * self.duration
         
@@ -85,6 +85,40 @@ class ResPartner(models.Model):
     def get_balance(self):
         return self.balance
 
+    def balance_at(self, date):
+        """Баланс клиента по журналу транзакций на момент date.
+
+        Учитываются транзакции строго до date (для даты - до начала дня).
+        Берется ближайшая предшествующая контрольная точка final.balance.snapshot
+        и к ней добавляется сумма транзакций после нее.
+        """
+        self.ensure_one()
+        moment = fields.Datetime.to_datetime(date)
+        self.env["final.balance.transaction"].flush_model()
+        self.env["final.balance.snapshot"].flush_model()
+        self.env.cr.execute(
+            """
+            WITH snapshot AS (
+                SELECT date, balance
+                  FROM final_balance_snapshot
+                 WHERE partner_id = %(partner_id)s
+                   AND date <= %(moment)s
+                 ORDER BY date DESC
+                 LIMIT 1
+            )
+            SELECT COALESCE((SELECT balance FROM snapshot), 0)
+                 + COALESCE((
+                       SELECT SUM(CASE WHEN transaction_type = 'deposit' THEN amount ELSE -amount END)
+                         FROM final_balance_transaction
+                        WHERE partner_id = %(partner_id)s
+                          AND date < %(moment)s
+                          AND date >= COALESCE((SELECT date FROM snapshot), '-infinity')
+                   ), 0)
+            """,
+            {"partner_id": self.id, "moment": moment},
+        )
+        return self.env.cr.fetchone()[0]
+
     def deposit_balance(self, amount, description=""):
         if amount <= 0:
             raise ValidationError(_("Сумма пополнения должна быть положительным числом."))
@@ -0,0 +1,137 @@
+"""Отправка сообщений в Telegram Bot API.
+
+Модуль не работает с ORM: потоки получают только chat_id и текст,
+а результаты возвращаются вызывающему коду для записи в очередь.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Размер пула потоков и соединений с api.telegram.org
+MAX_WORKERS = 16
+# Ограничения Telegram: ~30 сообщений в секунду всего и 1 сообщение в секунду в один чат
+GLOBAL_RATE = 30.0
+PER_CHAT_RATE = 1.0
+REQUEST_TIMEOUT = 5
+# Сколько ограничителей по чатам хранить, прежде чем удалить простаивающие
+MAX_CHAT_BUCKETS = 10000
+
+
+class TokenBucket:
+    """Потокобезопасный token bucket: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self):
+        """Забирает токен и возвращает, сколько секунд нужно подождать до его появления"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+
+
+class TelegramDeliveryEngine:
+    """Параллельная отправка сообщений с общей HTTP-сессией и ограничением частоты"""
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="final_telegram")
+        self.global_bucket = TokenBucket(GLOBAL_RATE)
+        self.chat_buckets = {}
+        self.chat_buckets_lock = threading.Lock()
+
+    def _get_chat_bucket(self, chat_id):
+        with self.chat_buckets_lock:
+            if len(self.chat_buckets) > MAX_CHAT_BUCKETS:
+                # Ограничитель, не использовавшийся дольше секунды, снова полон - его можно пересоздать
+                idle_before = time.monotonic() - 1.0 / PER_CHAT_RATE
+                self.chat_buckets = {
+                    key: value for key, value in self.chat_buckets.items() if value.updated > idle_before
+                }
+            bucket = self.chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self.chat_buckets[chat_id] = TokenBucket(PER_CHAT_RATE, capacity=1)
+            return bucket
+
+    def send(self, bot_token, chat_id, text):
+        """Отправляет одно сообщение с учетом ограничений частоты.
+
+        :return: (успех, текст ошибки, retry_after в секундах, ошибка окончательная)
+        """
+        self._get_chat_bucket(chat_id).acquire()
+        self.global_bucket.acquire()
+        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+        payload = {
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": "HTML",
+        }
+        try:
+            response = self.session.post(url, json=payload, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            return False, str(e), None, False
+
+        if response.ok:
+            return True, None, None, False
+
+        try:
+            data = response.json()
+            description = data.get("description") or response.text
+            retry_after = (data.get("parameters") or {}).get("retry_after")
+        except ValueError:
+            description = response.text
+            retry_after = None
+        error = "%s: %s" % (response.status_code, description)
+        # 429 и 5xx - временные ошибки, остальные 4xx (бот заблокирован, чат не найден) - окончательные
+        permanent = 400 <= response.status_code < 500 and response.status_code != 429
+        return False, error, retry_after, permanent
+
+    def send_many(self, bot_token, messages):
+        """Отправляет пакет сообщений параллельно.
+
+        :param messages: список кортежей (ключ, chat_id, текст)
+        :return: словарь {ключ: результат send()}
+        """
+        futures = {
+            key: self.executor.submit(self.send, bot_token, chat_id, text)
+            for key, chat_id, text in messages
+        }
+        results = {}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                results[key] = (False, str(e), None, False)
+        return results
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_delivery_engine():
+    """Общий для процесса экземпляр движка отправки"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = TelegramDeliveryEngine()
+        return _engine
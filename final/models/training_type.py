@@ -1,4 +1,4 @@
-from odoo import api, fields, models
+from odoo import api, fields, models, tools
 from odoo.exceptions import ValidationError
 
 
@@ -44,5 +44,35 @@ class FinalTrainingType(models.Model):
             if record.max_clients < record.min_clients:
                 raise ValidationError("Максимальное количество клиентов должно быть не меньше минимального.")
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
 
+    def write(self, vals):
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache()
+    def _get_type_ids_by_code(self):
+        """Словарь {код: id} активных видов тренировок.
+
+        Хранится в ormcache реестра и сбрасывается при изменении видов тренировок.
+        """
+        types = self.sudo().search([])
+        return tools.frozendict((training_type.code, training_type.id) for training_type in types)
+
+    @api.model
+    def get_by_code(self, code):
+        """Активный вид тренировки по коду (пустой набор, если не найден)"""
+        type_id = self._get_type_ids_by_code().get(code)
+        return self.browse(type_id) if type_id else self.browse()
 
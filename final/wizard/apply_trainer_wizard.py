@@ -122,9 +122,9 @@ class ApplyTrainerWizard(models.TransientModel):
         })
 
         TrainingType = self.env["final.training.type"]
-        individual_type = TrainingType.search([("code", "=", "individual")], limit=1)
-        split_type = TrainingType.search([("code", "=", "split")], limit=1)
-        group_type = TrainingType.search([("code", "=", "group")], limit=1)
+        individual_type = TrainingType.get_by_code("individual")
+        split_type = TrainingType.get_by_code("split")
+        group_type = TrainingType.get_by_code("group")
 
         TrainerRate = self.env["final.trainer.rate"].sudo()
         
@@ -1,6 +1,21 @@
+import csv
+import io
+import itertools
+import tempfile
 from datetime import timedelta
 
 from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+# Сколько строк детализации читается с сервера за один FETCH
+STREAM_FETCH_SIZE = 2000
+# Счетчик для уникальных имен серверных курсоров в рамках процесса
+_cursor_counter = itertools.count()
 
 
 class FinalProfitReportWizard(models.TransientModel):
@@ -43,65 +58,273 @@ class FinalProfitReportWizard(models.TransientModel):
                 action['url'] = f"{action['url']}{separator}download=1"
         return action
 
-    def _get_profit_data(self):
+    def _get_booking_where(self):
+        """Условие SQL по завершённым тренировкам периода и центров (алиас booking)"""
         self.ensure_one()
-        
-        # Подготовка домена по датам и СЦ
-        domain = [("state", "=", "completed")]
+        conditions = ["booking.state = 'completed'"]
+        params = []
         
         if self.date_from:
-            date_from_dt = fields.Datetime.to_datetime(self.date_from)
-            domain.append(("start_datetime", ">=", date_from_dt))
+            conditions.append("booking.start_datetime >= %s")
+            params.append(fields.Datetime.to_datetime(self.date_from))
         
         if self.date_to:
-            date_to_dt = fields.Datetime.to_datetime(self.date_to) + timedelta(days=1)
-            domain.append(("start_datetime", "<", date_to_dt))
+            conditions.append("booking.start_datetime < %s")
+            params.append(fields.Datetime.to_datetime(self.date_to) + timedelta(days=1))
         
         if self.center_ids:
-            domain.append(("sport_center_id", "in", self.center_ids.ids))
-        
-        # Получаем все завершенные тренировки
-        Booking = self.env["final.training.booking"].sudo()
-        bookings = Booking.search(domain, order="sport_center_id, start_datetime")
+            conditions.append("booking.sport_center_id = ANY(%s)")
+            params.append(self.center_ids.ids)
         
-        # Группируем данные по СЦ
-        centers_data = {}
-        total_profit = 0.0
-        total_bookings = 0
+        return " AND ".join(conditions), params
+
+    def _get_center_totals(self):
+        """Итоги по СЦ из предагрегированной дневной статистики"""
+        self.ensure_one()
+        conditions = ["stats.state = 'completed'"]
+        params = []
+        if self.date_from:
+            conditions.append("stats.date >= %s")
+            params.append(self.date_from)
+        if self.date_to:
+            conditions.append("stats.date <= %s")
+            params.append(self.date_to)
+        if self.center_ids:
+            conditions.append("stats.sport_center_id = ANY(%s)")
+            params.append(self.center_ids.ids)
+        self.env.cr.execute(
+            f"""
+            SELECT stats.sport_center_id,
+                   center.name,
+                   SUM(stats.booking_count),
+                   SUM(stats.revenue),
+                   SUM(stats.trainer_cost),
+                   SUM(stats.profit)
+              FROM final_booking_daily_stats stats
+              JOIN final_sport_center center ON center.id = stats.sport_center_id
+             WHERE {" AND ".join(conditions)}
+             GROUP BY stats.sport_center_id, center.name
+             ORDER BY stats.sport_center_id
+            """,
+            params,
+        )
+        return [
+            {
+                'id': center_id,
+                'name': name,
+                'bookings_count': count,
+                'price': price,
+                'trainer_rate': trainer_rate,
+                'profit': profit,
+            }
+            for center_id, name, count, price, trainer_rate, profit in self.env.cr.fetchall()
+        ]
+
+    def _iter_booking_rows(self, center_id=None):
+        """Построчная выдача детализации через серверный курсор (DECLARE/FETCH).
+
+        В памяти одновременно находится не больше STREAM_FETCH_SIZE строк.
+        Кортеж строки: (центр, дата, тренер, вид тренировки, стоимость, ставка тренера, прибыль).
+        """
+        self.ensure_one()
+        self.env["final.training.booking"].flush_model()
+        where, params = self._get_booking_where()
+        if center_id:
+            where += " AND booking.sport_center_id = %s"
+            params.append(center_id)
+        cursor_name = "final_profit_rows_%d" % next(_cursor_counter)
+        cr = self.env.cr
+        cr.execute(
+            f"""
+            DECLARE {cursor_name} NO SCROLL CURSOR FOR
+            SELECT center.name,
+                   booking.start_datetime::date,
+                   COALESCE(trainer.name, ''),
+                   COALESCE(training_type.name, ''),
+                   COALESCE(booking.total_price, 0),
+                   COALESCE(booking.trainer_rate_amount, 0),
+                   COALESCE(booking.profit_amount, 0)
+              FROM final_training_booking booking
+              JOIN final_sport_center center ON center.id = booking.sport_center_id
+              LEFT JOIN hr_employee trainer ON trainer.id = booking.trainer_id
+              LEFT JOIN final_training_type training_type ON training_type.id = booking.training_type_id
+             WHERE {where}
+             ORDER BY booking.sport_center_id, booking.start_datetime, booking.id
+            """,
+            params,
+        )
+        try:
+            while True:
+                cr.execute(f"FETCH {STREAM_FETCH_SIZE} FROM {cursor_name}")
+                rows = cr.fetchall()
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cr.execute(f"CLOSE {cursor_name}")
+
+    def _get_profit_data(self):
+        """Данные для PDF: итоги по СЦ из SQL, детализация - ленивыми итераторами по СЦ"""
+        self.ensure_one()
         
-        for booking in bookings:
-            center_id = booking.sport_center_id.id
-            center_name = booking.sport_center_id.name
-            
-            if center_id not in centers_data:
-                centers_data[center_id] = {
-                    'name': center_name,
-                    'profit': 0.0,
-                    'bookings_count': 0,
-                    'bookings': [],
+        centers = self._get_center_totals()
+        for center in centers:
+            center['bookings'] = (
+                {
+                    'date': date,
+                    'trainer': trainer,
+                    'training_type': training_type,
+                    'price': price,
+                    'trainer_rate': trainer_rate,
+                    'profit': profit,
                 }
-            
-            profit = booking.profit_amount or 0.0
-            centers_data[center_id]['profit'] += profit
-            centers_data[center_id]['bookings_count'] += 1
-            centers_data[center_id]['bookings'].append({
-                'id': booking.id,
-                'date': booking.start_datetime.date() if booking.start_datetime else False,
-                'trainer': booking.trainer_id.name if booking.trainer_id else '',
-                'training_type': booking.training_type_id.name if booking.training_type_id else '',
-                'price': booking.total_price or 0.0,
-                'trainer_rate': booking.trainer_rate_amount or 0.0,
-                'profit': profit,
-            })
-            
-            total_profit += profit
-            total_bookings += 1
+                for _center, date, trainer, training_type, price, trainer_rate, profit
+                in self._iter_booking_rows(center['id'])
+            )
         
         return {
-            'centers': list(centers_data.values()),
-            'total_profit': total_profit,
-            'total_bookings': total_bookings,
+            'centers': centers,
+            'total_profit': sum(center['profit'] for center in centers),
+            'total_bookings': sum(center['bookings_count'] for center in centers),
             'date_from': self.date_from,
             'date_to': self.date_to,
             'currency': self.currency_id,
         }
+
+    def _get_export_filename(self, extension):
+        self.ensure_one()
+        return "profit_report_%s_%s.%s" % (
+            self.date_from.strftime("%Y%m%d") if self.date_from else "",
+            self.date_to.strftime("%Y%m%d") if self.date_to else "",
+            extension,
+        )
+
+    def _get_export_headers(self):
+        return [
+            _("Спортивный центр"),
+            _("Дата"),
+            _("Тренер"),
+            _("Вид тренировки"),
+            _("Стоимость"),
+            _("Ставка тренера"),
+            _("Прибыль"),
+        ]
+
+    def _get_export_action(self, file_format):
+        """Скачивание выгрузки: файл формирует и отдает потоком контроллер"""
+        self.ensure_one()
+        return {
+            "type": "ir.actions.act_url",
+            "url": "/final/profit_report/%d/export/%s" % (self.id, file_format),
+            "target": "self",
+        }
+
+    def action_export_csv(self):
+        """Выгрузка детализации в CSV без рендеринга PDF"""
+        return self._get_export_action("csv")
+
+    def action_export_xlsx(self):
+        """Выгрузка итогов по СЦ и детализации в XLSX без рендеринга PDF"""
+        self.ensure_one()
+        if xlsxwriter is None:
+            raise UserError(_("Для выгрузки в XLSX требуется библиотека xlsxwriter."))
+        return self._get_export_action("xlsx")
+
+    def _export_to_tempfile(self, file_format):
+        """Записывает выгрузку во временный файл на диске.
+
+        Строки идут из серверного курсора прямо в файл, целиком выгрузка
+        в памяти не собирается. Файл удаляется при закрытии.
+
+        :return: (файл, открытый на чтение с начала, имя файла, mimetype)
+        """
+        self.ensure_one()
+        if file_format == "csv":
+            writer, mimetype = self._write_csv, "text/csv"
+        elif file_format == "xlsx":
+            if xlsxwriter is None:
+                raise UserError(_("Для выгрузки в XLSX требуется библиотека xlsxwriter."))
+            writer = self._write_xlsx
+            mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        else:
+            raise UserError(_("Неизвестный формат выгрузки: %s") % file_format)
+        fileobj = tempfile.TemporaryFile()
+        try:
+            writer(fileobj)
+            fileobj.seek(0)
+        except Exception:
+            fileobj.close()
+            raise
+        return fileobj, self._get_export_filename(file_format), mimetype
+
+    def _write_csv(self, fileobj):
+        # BOM, чтобы Excel правильно определил кодировку
+        stream = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        writer = csv.writer(stream, delimiter=";")
+        writer.writerow(self._get_export_headers())
+        for center, date, trainer, training_type, price, trainer_rate, profit in self._iter_booking_rows():
+            writer.writerow([
+                center,
+                date.strftime("%d.%m.%Y") if date else "",
+                trainer,
+                training_type,
+                "%.2f" % price,
+                "%.2f" % trainer_rate,
+                "%.2f" % profit,
+            ])
+        stream.flush()
+        # Файл остается открытым для отдачи клиенту
+        stream.detach()
+
+    def _write_xlsx(self, fileobj):
+        # constant_memory: строки листов пишутся во временные файлы по мере добавления
+        workbook = xlsxwriter.Workbook(fileobj, {"constant_memory": True, "in_memory": False})
+        bold = workbook.add_format({"bold": True})
+        money = workbook.add_format({"num_format": "#,##0.00"})
+        money_bold = workbook.add_format({"num_format": "#,##0.00", "bold": True})
+        date_format = workbook.add_format({"num_format": "dd.mm.yyyy"})
+        
+        totals_sheet = workbook.add_worksheet(_("Итоги"))
+        totals_sheet.write_row(0, 0, [
+            _("Спортивный центр"),
+            _("Количество тренировок"),
+            _("Стоимость"),
+            _("Ставка тренера"),
+            _("Прибыль"),
+        ], bold)
+        centers = self._get_center_totals()
+        row = 1
+        for center in centers:
+            totals_sheet.write(row, 0, center['name'])
+            totals_sheet.write_number(row, 1, center['bookings_count'])
+            totals_sheet.write_number(row, 2, center['price'], money)
+            totals_sheet.write_number(row, 3, center['trainer_rate'], money)
+            totals_sheet.write_number(row, 4, center['profit'], money)
+            row += 1
+        totals_sheet.write(row, 0, _("ИТОГО:"), bold)
+        totals_sheet.write_number(row, 1, sum(center['bookings_count'] for center in centers), bold)
+        totals_sheet.write_number(row, 2, sum(center['price'] for center in centers), money_bold)
+        totals_sheet.write_number(row, 3, sum(center['trainer_rate'] for center in centers), money_bold)
+        totals_sheet.write_number(row, 4, sum(center['profit'] for center in centers), money_bold)
+        totals_sheet.set_column(0, 0, 30)
+        totals_sheet.set_column(1, 4, 18)
+        
+        details_sheet = workbook.add_worksheet(_("Детализация"))
+        details_sheet.set_column(0, 0, 30)
+        details_sheet.set_column(1, 1, 12)
+        details_sheet.set_column(2, 3, 25)
+        details_sheet.set_column(4, 6, 16)
+        details_sheet.write_row(0, 0, self._get_export_headers(), bold)
+        row = 1
+        for center, date, trainer, training_type, price, trainer_rate, profit in self._iter_booking_rows():
+            details_sheet.write(row, 0, center)
+            if date:
+                details_sheet.write_datetime(row, 1, fields.Datetime.to_datetime(date), date_format)
+            details_sheet.write(row, 2, trainer)
+            details_sheet.write(row, 3, training_type)
+            details_sheet.write_number(row, 4, price, money)
+            details_sheet.write_number(row, 5, trainer_rate, money)
+            details_sheet.write_number(row, 6, profit, money)
+            row += 1
+        
+        workbook.close()
@@ -1,6 +1,7 @@
 from datetime import timedelta
 
 from odoo import _, api, fields, models
+from odoo.tools import format_amount, html_escape
 
 
 class FinalStatisticsReportWizard(models.TransientModel):
@@ -56,6 +57,27 @@ class FinalStatisticsReportWizard(models.TransientModel):
         readonly=True,
     )
 
+    top_n = fields.Integer(
+        string="Размер рейтинга",
+        default=5,
+        help="Сколько позиций показывать в рейтингах тренеров, видов тренировок и клиентов.",
+    )
+    top_trainers_html = fields.Html(
+        string="Рейтинг тренеров по прибыли",
+        readonly=True,
+        sanitize=False,
+    )
+    top_training_types_html = fields.Html(
+        string="Рейтинг видов тренировок",
+        readonly=True,
+        sanitize=False,
+    )
+    top_clients_html = fields.Html(
+        string="Рейтинг клиентов",
+        readonly=True,
+        sanitize=False,
+    )
+
     currency_id = fields.Many2one(
         "res.currency",
         string="Валюта",
@@ -63,7 +85,7 @@ class FinalStatisticsReportWizard(models.TransientModel):
         readonly=True,
     )
 
-    @api.onchange("date_from", "date_to", "center_ids")
+    @api.onchange("date_from", "date_to", "center_ids", "top_n")
     def _onchange_compute_statistics(self):
         for wizard in self:
             wizard._compute_statistics()
@@ -72,79 +94,159 @@ class FinalStatisticsReportWizard(models.TransientModel):
         self._compute_statistics()
         return False
 
-    def _compute_statistics(self):
+    def _get_booking_where(self):
+        """Условие SQL по завершённым тренировкам периода и центров (алиас booking)"""
         self.ensure_one()
+        conditions = ["booking.state = 'completed'"]
+        params = []
+
+        if self.date_from:
+            conditions.append("booking.start_datetime >= %s")
+            params.append(fields.Datetime.to_datetime(self.date_from))
+
+        if self.date_to:
+            conditions.append("booking.start_datetime < %s")
+            params.append(fields.Datetime.to_datetime(self.date_to) + timedelta(days=1))
+
+        if self.center_ids:
+            conditions.append("booking.sport_center_id = ANY(%s)")
+            params.append(self.center_ids.ids)
 
-        domain = [("state", "=", "completed")]
+        return " AND ".join(conditions), params
+
+    def _get_stats_where(self):
+        """Условие SQL по дневной статистике завершённых тренировок (алиас stats)"""
+        self.ensure_one()
+        conditions = ["stats.state = 'completed'"]
+        params = []
 
         if self.date_from:
-            date_from_dt = fields.Datetime.to_datetime(self.date_from)
-            domain.append(("start_datetime", ">=", date_from_dt))
+            conditions.append("stats.date >= %s")
+            params.append(self.date_from)
 
         if self.date_to:
-            date_to_dt = fields.Datetime.to_datetime(self.date_to) + timedelta(days=1)
-            domain.append(("start_datetime", "<", date_to_dt))
+            conditions.append("stats.date <= %s")
+            params.append(self.date_to)
 
         if self.center_ids:
-            domain.append(("sport_center_id", "in", self.center_ids.ids))
-
-        Booking = self.env["final.training.booking"].sudo()
-        bookings = Booking.search(domain)
-
-        trainer_profit = {}
-        for b in bookings:
-            if not b.trainer_id:
-                continue
-            trainer_profit[b.trainer_id.id] = trainer_profit.get(b.trainer_id.id, 0.0) + (
-                b.profit_amount or 0.0
-            )
-
-        if trainer_profit:
-            best_trainer_id = max(trainer_profit, key=trainer_profit.get)
-            self.most_profitable_trainer_id = self.env["hr.employee"].browse(
-                best_trainer_id
-            )
-            self.most_profitable_trainer_profit = trainer_profit[best_trainer_id]
+            conditions.append("stats.sport_center_id = ANY(%s)")
+            params.append(self.center_ids.ids)
+
+        return " AND ".join(conditions), params
+
+    def _fetch_rankings(self, limit):
+        """Три рейтинга, каждый одним запросом с GROUP BY и ORDER BY ... LIMIT.
+
+        Тренеры и виды тренировок считаются по дневной статистике,
+        клиенты - по тренировкам (клиентов в статистике нет).
+
+        :return: (тренеры [(id, прибыль)], виды [(id, количество)], клиенты [(id, количество)])
+        """
+        self.ensure_one()
+        self.env["final.training.booking"].flush_model()
+        self.env["res.partner"].flush_model(["is_company", "telegram_user_id"])
+        stats_where, stats_params = self._get_stats_where()
+        where, params = self._get_booking_where()
+        cr = self.env.cr
+
+        cr.execute(
+            f"""
+            SELECT stats.trainer_id, SUM(stats.profit) AS profit
+              FROM final_booking_daily_stats stats
+             WHERE {stats_where}
+               AND stats.trainer_id IS NOT NULL
+             GROUP BY stats.trainer_id
+             ORDER BY profit DESC, stats.trainer_id
+             LIMIT %s
+            """,
+            stats_params + [limit],
+        )
+        trainers = cr.fetchall()
+
+        cr.execute(
+            f"""
+            SELECT stats.training_type_id, SUM(stats.booking_count) AS booking_count
+              FROM final_booking_daily_stats stats
+             WHERE {stats_where}
+               AND stats.training_type_id IS NOT NULL
+             GROUP BY stats.training_type_id
+             ORDER BY booking_count DESC, stats.training_type_id
+             LIMIT %s
+            """,
+            stats_params + [limit],
+        )
+        training_types = cr.fetchall()
+
+        # Учитываем только "наших" реальных клиентов:
+        # - физлицо
+        # - с привязанным Telegram User ID (менеджер заполняет вручную)
+        cr.execute(
+            f"""
+            SELECT rel.partner_id, COUNT(*) AS booking_count
+              FROM final_training_booking booking
+              JOIN final_training_booking_partner_rel rel ON rel.booking_id = booking.id
+              JOIN res_partner partner ON partner.id = rel.partner_id
+             WHERE {where}
+               AND NOT COALESCE(partner.is_company, FALSE)
+               AND COALESCE(partner.telegram_user_id, 0) != 0
+             GROUP BY rel.partner_id
+             ORDER BY booking_count DESC, rel.partner_id
+             LIMIT %s
+            """,
+            params + [limit],
+        )
+        clients = cr.fetchall()
+
+        return trainers, training_types, clients
+
+    def _render_ranking(self, records, values, value_formatter=str):
+        """HTML-таблица рейтинга: место, название, значение"""
+        if not values:
+            return "<em>%s</em>" % html_escape(_("Нет данных за период"))
+        names = {record.id: record.display_name for record in records}
+        rows = "".join(
+            "<tr><td>%d</td><td>%s</td><td class='text-end'>%s</td></tr>"
+            % (position, html_escape(names.get(res_id, "")), html_escape(value_formatter(value)))
+            for position, (res_id, value) in enumerate(values, start=1)
+        )
+        return "<table class='table table-sm'><tbody>%s</tbody></table>" % rows
+
+    def _compute_statistics(self):
+        self.ensure_one()
+
+        limit = max(self.top_n, 1)
+        trainers, training_types, clients = self._fetch_rankings(limit)
+
+        trainer_records = self.env["hr.employee"].sudo().browse([row[0] for row in trainers])
+        type_records = self.env["final.training.type"].browse([row[0] for row in training_types])
+        client_records = self.env["res.partner"].sudo().browse([row[0] for row in clients])
+
+        if trainers:
+            self.most_profitable_trainer_id = trainer_records[:1]
+            self.most_profitable_trainer_profit = trainers[0][1]
         else:
             self.most_profitable_trainer_id = False
             self.most_profitable_trainer_profit = 0.0
 
-        type_counts = {}
-        for b in bookings:
-            if not b.training_type_id:
-                continue
-            type_counts[b.training_type_id.id] = type_counts.get(
-                b.training_type_id.id, 0
-            ) + 1
-
-        if type_counts:
-            best_type_id = max(type_counts, key=type_counts.get)
-            self.most_popular_training_type_id = self.env[
-                "final.training.type"
-            ].browse(best_type_id)
-            self.most_popular_training_type_count = type_counts[best_type_id]
+        if training_types:
+            self.most_popular_training_type_id = type_records[:1]
+            self.most_popular_training_type_count = training_types[0][1]
         else:
             self.most_popular_training_type_id = False
             self.most_popular_training_type_count = 0
 
-        client_counts = {}
-        for b in bookings:
-            for client in b.client_ids:
-                # Учитываем только "наших" реальных клиентов:
-                # - физлицо
-                # - с привязанным Telegram User ID (менеджер заполняет вручную)
-                if client.is_company or not client.telegram_user_id:
-                    continue
-                client_counts[client.id] = client_counts.get(client.id, 0) + 1
-
-        if client_counts:
-            best_client_id = max(client_counts, key=client_counts.get)
-            self.most_active_client_id = self.env["res.partner"].browse(best_client_id)
-            self.most_active_client_count = client_counts[best_client_id]
+        if clients:
+            self.most_active_client_id = client_records[:1]
+            self.most_active_client_count = clients[0][1]
         else:
             self.most_active_client_id = False
             self.most_active_client_count = 0
 
-        return True
-
+        currency = self.currency_id or self.env.company.currency_id
+        self.top_trainers_html = self._render_ranking(
+            trainer_records, trainers, lambda value: format_amount(self.env, value, currency)
+        )
+        self.top_training_types_html = self._render_ranking(type_records, training_types)
+        self.top_clients_html = self._render_ranking(client_records, clients)
 
+        return True
@@ -64,6 +64,38 @@ class TrainingBookingRescheduleWizard(models.TransientModel):
         string="Причина переноса",
         help="Укажите причину переноса тренировки",
     )
+    free_slots_info = fields.Html(
+        string="Свободные слоты",
+        compute="_compute_free_slots_info",
+        readonly=True,
+    )
+
+    @api.depends("booking_id", "date", "duration", "tennis_court_id")
+    def _compute_free_slots_info(self):
+        """Показывает свободное время начала на выбранную дату для корта и тренера тренировки"""
+        for record in self:
+            booking = record.booking_id.sudo()
+            if not booking or not record.date or not record.duration:
+                record.free_slots_info = ""
+                continue
+            
+            free_slots = self.env["final.training.booking"].find_free_slots(
+                booking.sport_center_id,
+                record.date,
+                record.date,
+                record.duration,
+                training_type=booking.training_type_id,
+                trainer=booking.trainer_id,
+                court=record.tennis_court_id or booking.tennis_court_id,
+                exclude_bookings=booking,
+            )
+            start_times = sorted({slot["start_datetime"].strftime("%H:%M") for slot in free_slots})
+            if start_times:
+                record.free_slots_info = (
+                    f"<div><strong>Свободное время начала:</strong> {', '.join(start_times)}</div>"
+                )
+            else:
+                record.free_slots_info = "<div><em>Свободных слотов на эту дату нет</em></div>"
 
     @api.model
     def default_get(self, fields_list):
@@ -130,16 +162,13 @@ class TrainingBookingRescheduleWizard(models.TransientModel):
         
         court_id = self.tennis_court_id.id if self.tennis_court_id else booking.tennis_court_id.id
         
+        booking_model = self.env["final.training.booking"]
         if court_id:
-            overlapping = self.env["final.training.booking"].search([
-                ("tennis_court_id", "=", court_id),
-                ("id", "!=", booking.id),
-                ("state", "in", ["confirmed", "pending_approval", "draft"]),
-                ("start_datetime", "<", end_datetime),
-                ("end_datetime", ">", start_datetime),
-            ], limit=1)
+            overlapping_id = booking_model._find_occupancy_overlap(
+                "tennis_court_id", court_id, start_datetime, end_datetime, exclude_ids=(booking.id,)
+            )
             
-            if overlapping:
+            if overlapping_id:
                 court_name = self.tennis_court_id.name if self.tennis_court_id else booking.tennis_court_id.name
                 return {
                     "warning": {
@@ -153,15 +182,11 @@ class TrainingBookingRescheduleWizard(models.TransientModel):
         
         trainer_id = booking.trainer_id.id if booking.trainer_id else False
         if trainer_id:
-            overlapping = self.env["final.training.booking"].search([
-                ("trainer_id", "=", trainer_id),
-                ("id", "!=", booking.id),
-                ("state", "in", ["draft", "pending_approval", "confirmed"]),
-                ("start_datetime", "<", end_datetime),
-                ("end_datetime", ">", start_datetime),
-            ], limit=1)
+            overlapping_id = booking_model._find_occupancy_overlap(
+                "trainer_id", trainer_id, start_datetime, end_datetime, exclude_ids=(booking.id,)
+            )
             
-            if overlapping:
+            if overlapping_id:
                 trainer_name = booking.trainer_id.name if booking.trainer_id else _("Не указан")
                 return {
                     "warning": {
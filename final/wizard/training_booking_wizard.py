@@ -208,7 +208,7 @@ class TrainingBookingWizard(models.TransientModel):
                     f"Выбрано клиентов: {client_count} из {max_clients if max_clients == min_clients else f'{min_clients}-{max_clients}'} ✓"
                 )
 
-    @api.depends("tennis_court_id", "date", "sport_center_id")
+    @api.depends("tennis_court_id", "date", "sport_center_id", "trainer_id", "training_type_id", "duration")
     def _compute_available_slots_info(self):
         """Вычисляет и показывает занятые/свободные слоты"""
         for record in self:
@@ -221,26 +221,34 @@ class TrainingBookingWizard(models.TransientModel):
             work_start = int(center.work_time_start)
             work_end = int(center.work_time_end)
             
-            # Получаем все занятые слоты на этот день
-            start_of_day = fields.Datetime.to_datetime(record.date).replace(hour=0, minute=0, second=0)
-            end_of_day = start_of_day + timedelta(days=1)
-            
-            bookings = self.env["final.training.booking"].search([
-                ("tennis_court_id", "=", record.tennis_court_id.id),
-                ("start_datetime", ">=", start_of_day),
-                ("start_datetime", "<", end_of_day),
-                ("state", "in", ["draft", "pending_approval", "confirmed"]),
-            ])
+            # Получаем все занятые слоты корта на этот день
+            occupancy = self.env["final.training.booking"]._get_day_occupancy(
+                "tennis_court_id", record.tennis_court_id.id, record.date
+            )
+            # Занятость читается с sudo() и дает только интервалы; подробности показываем
+            # лишь по тренировкам, доступным пользователю по правилам доступа
+            readable = {
+                booking.id: booking
+                for booking in self.env["final.training.booking"].search([
+                    ("id", "in", [booking_id for _start, _end, booking_id in occupancy]),
+                ])
+            }
             
             # Формируем HTML с информацией о занятости
             html_parts = ["<div style='margin: 10px 0;'>"]
             html_parts.append(f"<strong>Рабочие часы: {work_start}:00 - {work_end}:00</strong><br/>")
             
-            if bookings:
+            if occupancy:
                 html_parts.append("<br/><strong>Занятые слоты:</strong><ul>")
-                for booking in bookings:
-                    start = fields.Datetime.context_timestamp(record, booking.start_datetime)
-                    end = fields.Datetime.context_timestamp(record, booking.end_datetime)
+                for busy_start, busy_end, booking_id in occupancy:
+                    start = fields.Datetime.context_timestamp(record, busy_start)
+                    end = fields.Datetime.context_timestamp(record, busy_end)
+                    booking = readable.get(booking_id)
+                    if not booking:
+                        html_parts.append(
+                            f"<li>{start.strftime('%H:%M')} - {end.strftime('%H:%M')} (занято)</li>"
+                        )
+                        continue
                     trainer_name = booking.trainer_id.name if booking.trainer_id else "Не указан"
                     clients = ", ".join(booking.client_ids.mapped("name")) if booking.client_ids else "Нет клиентов"
                     html_parts.append(
@@ -251,6 +259,24 @@ class TrainingBookingWizard(models.TransientModel):
             else:
                 html_parts.append("<br/><em>Корт свободен весь день</em>")
             
+            # Свободное время начала на этом корте (с учетом занятости тренера, если он выбран)
+            free_slots = self.env["final.training.booking"].find_free_slots(
+                center,
+                record.date,
+                record.date,
+                record.duration or 1.0,
+                training_type=record.training_type_id,
+                trainer=record.trainer_id,
+                court=record.tennis_court_id,
+            )
+            start_times = sorted({slot["start_datetime"].strftime("%H:%M") for slot in free_slots})
+            if start_times:
+                html_parts.append(
+                    f"<br/><strong>Свободное время начала:</strong> {', '.join(start_times)}"
+                )
+            else:
+                html_parts.append("<br/><em>Свободных слотов на эту дату нет</em>")
+            
             html_parts.append("</div>")
             record.available_slots_info = "".join(html_parts)
 
@@ -589,14 +615,11 @@ class TrainingBookingWizard(models.TransientModel):
                 }
             
             # Проверяем пересечение с существующими записями
-            bookings = self.env["final.training.booking"].search([
-                ("tennis_court_id", "=", self.tennis_court_id.id),
-                ("state", "in", ["draft", "pending_approval", "confirmed"]),
-                ("start_datetime", "<", end_datetime),
-                ("end_datetime", ">", start_datetime),
-            ], limit=1)
+            overlapping_id = self.env["final.training.booking"]._find_occupancy_overlap(
+                "tennis_court_id", self.tennis_court_id.id, start_datetime, end_datetime
+            )
             
-            if bookings:
+            if overlapping_id:
                 old_court_name = self.tennis_court_id.name
                 self.tennis_court_id = False
                 return {
@@ -682,14 +705,11 @@ class TrainingBookingWizard(models.TransientModel):
             }
         
         # Проверяем пересечение с существующими записями
-        bookings = self.env["final.training.booking"].search([
-            ("tennis_court_id", "=", self.tennis_court_id.id),
-            ("state", "in", ["draft", "pending_approval", "confirmed"]),
-            ("start_datetime", "<", end_datetime),
-            ("end_datetime", ">", start_datetime),
-        ], limit=1)
+        overlapping_id = self.env["final.training.booking"]._find_occupancy_overlap(
+            "tennis_court_id", self.tennis_court_id.id, start_datetime, end_datetime
+        )
         
-        if bookings:
+        if overlapping_id:
             # Сбрасываем корт, если он занят
             old_court_name = self.tennis_court_id.name
             self.tennis_court_id = False
@@ -819,14 +839,9 @@ class TrainingBookingWizard(models.TransientModel):
         is_manager = user.has_group("final.group_final_manager")
         
         # Получаем цену за час для расчета стоимости
-        price_per_hour = 0.0
-        if self.sport_center_id and self.training_type_id:
-            price_record = self.env["final.center.training.price"].search([
-                ("center_id", "=", self.sport_center_id.id),
-                ("training_type_id", "=", self.training_type_id.id),
-            ], limit=1)
-            if price_record:
-                price_per_hour = price_record.price_per_hour
+        price_per_hour = self.env["final.center.training.price"].get_price_per_hour(
+            self.sport_center_id, self.training_type_id
+        )
         
         # Рассчитываем стоимость для каждого клиента
         total_cost_per_client = price_per_hour * self.duration
@@ -914,6 +929,7 @@ class TrainingBookingWizard(models.TransientModel):
             # Связываем booking с шаблоном и помечаем как повторяющуюся
             booking.write({
                 "recurring_id": recurring.id,
+                "recurring_date": booking.start_datetime.date(),
                 "is_recurring": True,
             })
             
@@ -29,13 +29,14 @@ bot = Bot(token=TG_BOT_TOKEN, parse_mode=ParseMode.HTML)
 dp = Dispatcher()
 
 
-async def call_odoo(path: str, telegram_user_id: int) -> Dict[str, Any]:
+async def call_odoo(path: str, telegram_user_id: int, **params: Any) -> Dict[str, Any]:
     base = ODOO_BASE_URL.rstrip("/")
     url = f"{base}{path}"
 
     payload = {
         "api_token": ODOO_API_TOKEN,
         "telegram_user_id": telegram_user_id,
+        **params,
     }
 
     async with aiohttp.ClientSession() as session:
@@ -95,6 +96,7 @@ async def cmd_start(message: Message) -> None:
         "Доступные команды:\n"
         "/balance — показать баланс\n"
         "/my_trainings — показать ближайшие тренировки\n"
+        "/free_slots — свободное время для записи\n"
         "/help — справка"
     )
 
@@ -105,7 +107,8 @@ async def cmd_help(message: Message) -> None:
         "Доступные команды:\n"
         "/start — проверка привязки аккаунта и приветствие\n"
         "/balance — показать баланс\n"
-        "/my_trainings — показать ближайшие тренировки"
+        "/my_trainings — показать ближайшие тренировки\n"
+        "/free_slots — свободное время для записи на ближайшие 3 дня"
     )
 
 
@@ -179,6 +182,46 @@ async def cmd_my_trainings(message: Message) -> None:
     await message.answer("\n".join(lines))
 
 
+@dp.message(Command("free_slots"))
+async def cmd_free_slots(message: Message) -> None:
+    telegram_id = message.from_user.id
+
+    try:
+        data = await call_odoo("/api/tg/free_slots", telegram_id, days=3)
+    except Exception as e:  # noqa: BLE001
+        await message.answer(
+            "Произошла ошибка при соединении с системой. Попробуйте позже.\n"
+            f"Техническая информация: {e}"
+        )
+        return
+
+    if not data.get("success"):
+        await message.answer(
+            "Не удалось получить свободное время.\n"
+            "Возможно, ваш аккаунт ещё не привязан. Попробуйте /start."
+        )
+        return
+
+    slots = data.get("slots") or []
+    if not slots:
+        await message.answer("На ближайшие дни свободного времени нет.")
+        return
+
+    # Группируем по центру и дате, чтобы сообщение оставалось компактным
+    grouped: Dict[tuple, list[str]] = {}
+    for s in slots:
+        key = (s.get("sport_center", ""), s.get("date", ""))
+        grouped.setdefault(key, []).append(s.get("time_start", ""))
+
+    lines: list[str] = []
+    for (center, date), times in grouped.items():
+        lines.append(f"🏟 {center}\n📅 <b>{date}</b>: {', '.join(times)}\n")
+
+    await message.answer(
+        "\n".join(lines) + "\nДля записи свяжитесь с менеджером центра."
+    )
+
+
 async def main() -> None:
     await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
 